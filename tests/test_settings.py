@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+import whisk_automation as wa
+
+
+def load(tmp_path, data, environ=None):
+    path = tmp_path / "whisk_config.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return wa.load_settings(str(path), environ={} if environ is None else environ)
+
+
+def test_strings_in_config_file_are_parsed_to_the_setting_type(tmp_path):
+    settings = load(tmp_path, {"HEADLESS": "false", "WORKER_COUNT": "2", "RUN_RATE_PER_MINUTE": "3"})
+    assert settings == {"HEADLESS": False, "WORKER_COUNT": 2, "RUN_RATE_PER_MINUTE": 3.0}
+
+
+def test_bad_values_in_config_file_are_skipped(tmp_path):
+    settings = load(tmp_path, {"HEADLESS": 1, "WORKER_COUNT": True, "RUN_RATE_PER_MINUTE": "fast",
+                               "SUPPORTED_EXTENSIONS": "png", "CHROME_EXECUTABLE": ["chrome"]})
+    assert settings == {}
+
+
+def test_environment_wins_over_config_file(tmp_path):
+    settings = load(tmp_path, {"WORKER_COUNT": 2}, environ={"WHISK_WORKER_COUNT": "4"})
+    assert settings == {"WORKER_COUNT": 4}
+
+
+@pytest.mark.parametrize("name, value, expected", [
+    ("HEADLESS", True, True),
+    ("WORKER_COUNT", 3, 3),
+    ("RUN_RATE_PER_MINUTE", 2, 2.0),
+    ("SUPPORTED_EXTENSIONS", [".png"], (".png",)),
+    ("NORMALIZE_PROCESSES", None, None),
+    ("NORMALIZE_PROCESSES", "2", 2),
+    ("RESULT_URL_PATTERN", "null", None),
+    ("CHROME_EXECUTABLE", 5, "5"),
+])
+def test_coerce_setting(name, value, expected):
+    assert wa.coerce_setting(name, value, getattr(wa, name)) == expected
+
+
+@pytest.mark.parametrize("name, value", [
+    ("HEADLESS", "maybe"),
+    ("WORKER_COUNT", 2.5),
+    ("WORKER_COUNT", None),
+    ("NORMALIZE_PROCESSES", False),
+])
+def test_coerce_setting_rejects(name, value):
+    with pytest.raises(ValueError):
+        wa.coerce_setting(name, value, getattr(wa, name))
@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import argparse
+
+# ==========================================
+# COMMAND LINE
+# ==========================================
+# One entry point for the bot:
+#   python whisk.py run [flags]      process the image folders (or --manifest)
+#   python whisk.py resume [flags]   skip images the journal marks as done
+#   python whisk.py retry [flags]    only redo failed/interrupted images
+#   python whisk.py list [flags]     show what a run would process, without a browser
+#   python whisk.py status [--json]  journal, results, running browsers and daemon
+#   python whisk.py bench | async | daemon ...
+# Run flags are the same as whisk_automation.py's (`python whisk.py run --help`).
+# Modules are imported only by the command that needs them, and Playwright only once a
+# browser is actually started, so list/status answer right away.
+
+# command -> (help, extra flags put in front of the user's)
+RUN_COMMANDS = {
+    "run": ("process the image folders (or a --manifest)", []),
+    "resume": ("continue a run, skipping images already done", ["--resume"]),
+    "retry": ("only redo images that failed or were interrupted", ["--retry-failed"]),
+    "list": ("list the jobs a run would process, without starting a browser", ["--dry-run"]),
+}
+
+def collect_status(config_path=None):
+    """Journal counts, saved results, the bot's running browsers and the daemon, as a dict."""
+    import whisk_automation as wa
+    import whisk_daemon
+
+    wa.apply_config(config_path, verbose=False)
+    profiles = {wa.worker_profile_dir(worker_id) for worker_id in range(max(1, wa.WORKER_COUNT))}
+    profiles |= {wa.shard_profile_dir(index) for index in range(max(1, wa.SHARD_COUNT))}
+
+    results = 0
+    manifest = os.path.join(wa.RESULTS_DIR, "manifest.jsonl") if wa.RESULTS_DIR else None
+    if manifest and os.path.exists(manifest):
+        with open(manifest, encoding="utf-8") as f:
+            results = sum(1 for line in f if line.strip())
+
+    return {
+        "journal_file": wa.JOURNAL_FILE,
+        "journal": wa.journal_counts() if wa.JOURNAL_FILE else {},
+        "results_dir": wa.RESULTS_DIR,
+        "results": results,
+        "browsers": {profile: wa.running_browser_pid(profile) for profile in sorted(profiles)},
+        "daemon": whisk_daemon.daemon_running(),
+    }
+
+def print_status(status):
+    journal = ", ".join(f"{n} {state}" for state, n in sorted(status["journal"].items())) or "empty"
+    print(f"📒 Journal: {journal} ({status['journal_file']})")
+    print(f"💾 Results: {status['results']} image(s) in {status['results_dir']}")
+    for profile, pid in status["browsers"].items():
+        print(f"🌐 {profile}: {f'Chrome running (PID {pid})' if pid else 'no browser running'}")
+    daemon = status["daemon"]
+    if daemon:
+        print(f"🛰️ Daemon: {daemon['finished']}/{daemon['queued']} finished{' — idle' if daemon['idle'] else ''}")
+    else:
+        print("🛰️ Daemon: not running")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="whisk", description="Whisk Automation Bot")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="command")
+    # These hand their arguments to the module that runs them (which also answers --help)
+    for name, (help_text, _) in RUN_COMMANDS.items():
+        commands.add_parser(name, help=help_text, add_help=False)
+    commands.add_parser("bench", help="offline benchmark against the local mock page", add_help=False)
+    commands.add_parser("async", help="run with the async engine (several tabs, one browser)", add_help=False)
+    commands.add_parser("daemon", help="warm-browser daemon: serve / submit / status / stop", add_help=False)
+
+    status_cmd = commands.add_parser("status", help="journal, results, running browsers and daemon")
+    status_cmd.add_argument("--config", default=None, metavar="FILE", help="JSON settings file")
+    status_cmd.add_argument("--json", action="store_true", help="print machine-readable JSON")
+
+    args, rest = parser.parse_known_args(argv)
+    if args.command in RUN_COMMANDS:
+        import whisk_automation
+        return whisk_automation.main(RUN_COMMANDS[args.command][1] + rest)
+    if args.command == "bench":
+        import whisk_bench
+        return whisk_bench.main(rest)
+    if args.command == "async":
+        import whisk_async
+        return whisk_async.main(rest)
+    if args.command == "daemon":
+        import whisk_daemon
+        return whisk_daemon.main(rest)
+
+    if rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    status = collect_status(args.config)
+    if args.json:
+        print(json.dumps(status, indent=2))
+    else:
+        print_status(status)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,801 @@
+import re
+import sys
+import json
+import time
+import queue
+import asyncio
+import functools
+import threading
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+import whisk_automation as wa
+
+# ==========================================
+# ASYNC ENGINE
+# ==========================================
+# The same flow as whisk_automation.py on playwright.async_api: several Whisk tabs are
+# driven from one event loop, and independent probes run concurrently with asyncio.gather.
+# Selectors, in-page JS, the strategy cache, journal, readiness stats and metrics are all
+# shared with whisk_automation.py.
+
+# Number of Whisk tabs processing images at the same time. They all live in one browser
+# with the bot profile, so you only log in once.
+PAGE_COUNT = 3
+
+def in_thread(func, *args, **kwargs):
+    """Runs a blocking call on the default executor (asyncio.to_thread() needs Python 3.9)."""
+    return asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+# ==========================================
+# TIMING
+# ==========================================
+
+@asynccontextmanager
+async def phase_timer(phase, job, **fields):
+    """
+    Async version of whisk_automation.phase_timer(). `job` is the per-image dict
+    ({"worker", "image", "timings"}) since tasks can't use thread-local context.
+    """
+    rec = dict(fields)
+    started = time.time()
+    ok = True
+    try:
+        yield rec
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        seconds = time.time() - started
+        ok = bool(rec.get("ok", True)) and ok
+        job["timings"][phase] = job["timings"].get(phase, 0.0) + seconds
+        extra = {k: v for k, v in rec.items() if k != "ok"}
+        wa.record_phase(phase, seconds, ok=ok, worker=job["worker"], image=job["image"], **extra)
+
+# ==========================================
+# READINESS WAITS
+# ==========================================
+
+async def uploads_idle(page, timeout_ms, quiet_ms=300):
+    """Async version of whisk_automation.uploads_idle() (same per-page tracker)."""
+    tracker = wa._UPLOAD_TRACKERS.get(page)
+    if tracker is None:
+        return False
+    deadline = time.time() + timeout_ms / 1000
+    while time.time() < deadline:
+        quiet_for = (time.time() - tracker["last_change"]) * 1000
+        if tracker["inflight"] == 0 and quiet_for >= quiet_ms:
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+async def section_has_image(container, timeout_ms):
+    if not container:
+        return False
+    await container.locator("img").first.wait_for(state="visible", timeout=timeout_ms)
+    return True
+
+async def section_is_empty(container, timeout_ms):
+    if not container:
+        return False
+    await container.locator(wa.SELECTORS["delete_image"]).first.wait_for(state="hidden", timeout=timeout_ms)
+    return True
+
+async def element_detached(page, handle, timeout_ms):
+    if not handle:
+        return False
+    await page.wait_for_function("([el]) => !el.isConnected", arg=[handle], timeout=timeout_ms)
+    return True
+
+async def inputs_cleared(page, timeout_ms):
+    await page.locator(wa.SELECTORS["delete_image"]).first.wait_for(state="hidden", timeout=timeout_ms)
+    return True
+
+async def run_button_enabled(page, timeout_ms):
+    if not await page.evaluate(wa.RUN_BUTTON_EXISTS_JS, wa.RUN_BUTTON_LABELS):
+        return False
+    await page.wait_for_function(wa.RUN_BUTTON_ENABLED_JS, arg=wa.RUN_BUTTON_LABELS, timeout=timeout_ms)
+    return True
+
+async def stop_button_gone(page, timeout_ms):
+    await page.locator(wa.SELECTORS["stop_button"]).first.wait_for(state="hidden", timeout=timeout_ms)
+    return True
+
+async def wait_ready(phase, fallback_seconds, *checks, timeout_ms=None):
+    """
+    Async version of whisk_automation.wait_ready(): all checks run concurrently
+    (they are independent signals); any that fails means we fall back to the fixed pause.
+    """
+    timeout_ms = wa.ready_timeout_ms(fallback_seconds) if timeout_ms is None else timeout_ms
+    started = time.time()
+    signalled = False
+    if checks and not wa.ready_signal_unavailable(phase):
+        results = await asyncio.gather(*(check(timeout_ms) for check in checks), return_exceptions=True)
+        signalled = all(result is True for result in results)
+
+    if not signalled:
+        leftover = fallback_seconds - (time.time() - started)
+        if leftover > 0:
+            await asyncio.sleep(leftover)
+
+    wa.record_ready(phase, signalled, time.time() - started, fallback_seconds)
+    return signalled
+
+# ==========================================
+# PAGE HELPERS
+# ==========================================
+
+async def find_section_container(page, section_name):
+    """Async version of whisk_automation.find_section_container() (same in-page cache)."""
+    try:
+        names = list(wa.SELECTORS["sections"])
+        if section_name not in names:
+            names.append(section_name)
+
+        found = (await page.evaluate(wa.RESOLVE_SECTIONS_JS, names))[section_name]
+        if not found["header"]:
+            await page.wait_for_function(
+                f"({wa.RESOLVE_SECTIONS_JS})({json.dumps(names)})[{json.dumps(section_name)}].header",
+                timeout=2000,
+            )
+            found = (await page.evaluate(wa.RESOLVE_SECTIONS_JS, names))[section_name]
+
+        header = page.locator(f"[data-whisk-section-header~='{section_name}']").first
+        if not found["container"]:
+            return header, None
+        return header, page.locator(f"[data-whisk-section~='{section_name}']").first
+    except Exception:
+        return None, None
+
+async def is_visible(locator, timeout=0):
+    """locator.is_visible() that returns False instead of raising."""
+    try:
+        return await locator.is_visible(timeout=timeout)
+    except Exception:
+        return False
+
+async def click_snapshot_item(page, item):
+    target = wa.snapshot_locator(page, item)
+    try:
+        await target.click(force=True, timeout=3000)
+        return True
+    except Exception:
+        try:
+            await target.evaluate("el => el.click()")
+            return True
+        except Exception:
+            return False
+
+async def delete_existing_image(page, section_name, container):
+    if not container:
+        return False
+    try:
+        for btn in await container.locator(wa.SELECTORS["delete_image"]).all():
+            if await is_visible(btn, 500):
+                await btn.click()
+                print(f"    🗑️ Deleted existing image in '{section_name}'.")
+                await wait_ready("delete", 1, lambda t: section_is_empty(container, t))
+                return True
+    except Exception:
+        pass
+    return False
+
+# ==========================================
+# UPLOAD
+# ==========================================
+
+async def probe_upload_strategies(page, header, container):
+    """
+    Checks which upload strategies can apply, all probes at once.
+    Returns (applicable strategy names, header_box).
+    """
+    async def count(locator):
+        try:
+            return await locator.count()
+        except Exception:
+            return 0
+
+    async def draggable_empty():
+        draggable = container.locator("div[role='button'][aria-roledescription='draggable']").first
+        visible, imgs = await asyncio.gather(is_visible(draggable, 1000), count(draggable.locator("img")))
+        return visible and imgs == 0
+
+    async def nothing():
+        return False
+
+    async def header_box():
+        try:
+            return await header.bounding_box()
+        except Exception:
+            return None
+
+    has_input, empty_area, add_visible, box = await asyncio.gather(
+        count(container.locator("input[type='file']")) if container else nothing(),
+        draggable_empty() if container else nothing(),
+        is_visible(container.locator("button[aria-label='Add new category']").first, 1000) if container else nothing(),
+        header_box(),
+    )
+    applicable = {"nearest_input"}
+    if has_input:
+        applicable.add("file_input")
+    if empty_area:
+        applicable.add("draggable")
+    if add_visible:
+        applicable.add("add_category")
+    if box:
+        applicable.add("header_click")
+    return applicable, box
+
+async def upload_with_strategy(page, name, section_name, file_path, header_box, container):
+    """Runs one named upload strategy (see whisk_automation.UPLOAD_STRATEGIES)."""
+    async def via_chooser(click):
+        async with page.expect_file_chooser(timeout=5000) as fc:
+            await click()
+        await (await fc.value).set_files(file_path)
+
+    try:
+        if name == "file_input":
+            await container.locator("input[type='file']").first.set_input_files(file_path)
+        elif name == "draggable":
+            await via_chooser(container.locator("div[role='button'][aria-roledescription='draggable']").first.click)
+        elif name == "add_category":
+            await via_chooser(container.locator("button[aria-label='Add new category']").first.click)
+        elif name == "header_click":
+            x = header_box['x'] + header_box['width'] / 2
+            y = header_box['y'] + 120
+            await via_chooser(lambda: page.mouse.click(x, y))
+        elif name == "nearest_input":
+            inputs = await page.locator("input[type='file']").all()
+            boxes = await asyncio.gather(*(inp.bounding_box() for inp in inputs), return_exceptions=True)
+            candidates = [(abs(b['y'] - header_box['y']), inp) for inp, b in zip(inputs, boxes)
+                          if isinstance(b, dict) and header_box]
+            if not candidates:
+                return False
+            await min(candidates, key=lambda c: c[0])[1].set_input_files(file_path)
+        else:
+            return False
+        print(f"    ✅ Uploaded to '{section_name}' via {name}.")
+        return True
+    except Exception as e:
+        print(f"    ⚠️ {name} failed for '{section_name}': {e}")
+        return False
+
+async def upload_image(page, section_name, file_path, job, shared_file=None):
+    """Async version of whisk_automation.upload_image()."""
+    print(f"  ⬆️ Uploading to '{section_name}'...")
+    try:
+        async with phase_timer("section_lookup", job):
+            header, container = await find_section_container(page, section_name)
+        if not header:
+            print(f"    ⚠️ Header for '{section_name}' not found.")
+            return False
+
+        if container:
+            async with phase_timer("delete", job):
+                deleted = await delete_existing_image(page, section_name, container)
+            if deleted:
+                await wait_ready("delete_settle", 1, lambda t: uploads_idle(page, t))
+                header, container = await find_section_container(page, section_name)
+
+        if shared_file and container:
+            async with phase_timer("upload:shared_file", job, section=section_name) as rec:
+                try:
+                    await container.locator("input[type='file']").first.evaluate(wa.ASSIGN_FILE_JS, shared_file)
+                    print(f"    ✅ Uploaded to '{section_name}' via shared in-page file.")
+                    rec["ok"] = await upload_settled(page, container)
+                except Exception as e:
+                    print(f"    ⚠️ Shared file assign failed: {e}")
+                    rec["ok"] = False
+            if rec["ok"]:
+                return True
+            print(f"    ⚠️ '{section_name}' didn't take the shared file, using the upload strategies...")
+
+        applicable, header_box = await probe_upload_strategies(page, header, container)
+        tried = []  # Only strategies that actually ran — ones that don't apply here aren't demoted
+        for name in wa.strategy_order(section_name):
+            if name not in applicable:
+                continue
+            tried.append(name)
+            async with phase_timer(f"upload:{name}", job, section=section_name) as rec:
+                rec["ok"] = await upload_with_strategy(page, name, section_name, file_path, header_box, container)
+            if rec["ok"]:
+                wa.record_strategy_result(section_name, tried, name)
+                await upload_settled(page, container)
+                return True
+
+        wa.record_strategy_result(section_name, tried, None)
+        print(f"    ❌ Failed to upload to '{section_name}'.")
+        return False
+    except Exception as e:
+        print(f"    ❌ Error uploading to '{section_name}': {e}")
+        return False
+
+async def upload_settled(page, container):
+    """Returns True if the thumbnail is there (the page accepted the file)."""
+    if await wait_ready("upload", 1,
+                        lambda t: section_has_image(container, t),
+                        lambda t: uploads_idle(page, t)):
+        return True
+    try:
+        return bool(container) and await container.locator("img").count() > 0
+    except Exception:
+        return False
+
+# ==========================================
+# RUN / WAIT / CLEAR
+# ==========================================
+
+async def wait_previous_generation(page):
+    """Async version of whisk_automation.wait_previous_generation()."""
+    for i in range(15):
+        if not await is_visible(page.locator(wa.SELECTORS["stop_button"]).first, 500):
+            break
+        print(f"    ⏳ Previous generation running. Waiting... ({i+1}/15)")
+        await asyncio.sleep(2)
+
+async def run_generation(page, job):
+    """Async version of whisk_automation.run_generation()."""
+    print("  ▶️ Clicking Run button...")
+    async with phase_timer("run_click", job) as rec:
+        try:
+            snapshot = await page.evaluate(wa.SNAPSHOT_JS, "button")
+            for item, strategy, description in wa.run_button_candidates(snapshot):
+                print(f"    👉 Found button: {description}")
+                if await click_snapshot_item(page, item):
+                    rec["strategy"] = strategy
+                    print("    ✅ Clicked Run button.")
+                    return True
+
+            print("    ⚠️ No Run button found. Trying Enter key as fallback...")
+            rec["strategy"] = "enter_key"
+            await page.keyboard.press("Enter")
+            return True
+        except Exception as e:
+            print(f"    ❌ Error during run_generation: {e}")
+            rec["ok"] = False
+            return False
+
+async def generation_running(page):
+    stop_visible, generating_visible = await asyncio.gather(
+        is_visible(page.locator(wa.SELECTORS["stop_button"]).first),
+        is_visible(page.locator("text=Generating").first),
+    )
+    return stop_visible or generating_visible
+
+async def poll_generation(page, want_running, timeout_ms):
+    """Async version of whisk_automation.poll_generation() (backoff polling fallback)."""
+    deadline = time.time() + timeout_ms / 1000
+    interval = wa.GENERATION_POLL_MIN_SECONDS
+    while True:
+        if await generation_running(page) == want_running:
+            return True
+        if time.time() >= deadline:
+            return False
+        await asyncio.sleep(min(interval, max(0, deadline - time.time())))
+        interval = min(interval * 2, wa.GENERATION_POLL_MAX_SECONDS)
+
+async def wait_generation_state(page, watching, script, want_running, timeout_ms):
+    if watching:
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+        try:
+            await page.wait_for_function(script, timeout=timeout_ms, polling=100)
+            return True
+        except PlaywrightTimeoutError:
+            return False
+        except Exception:
+            pass  # Page navigated / observer gone — finish the wait by polling
+    return await poll_generation(page, want_running, timeout_ms)
+
+async def install_generation_watcher(page):
+    try:
+        await page.evaluate(wa.GENERATION_WATCH_JS, wa.SELECTORS["stop_button"])
+        return True
+    except Exception as e:
+        print(f"    ⚠️ Generation observer unavailable ({e}), polling instead.")
+        return False
+
+async def wait_for_generation(page, watching):
+    """
+    Async version of whisk_automation.wait_for_generation() (in-page observer, polling fallback).
+    `watching` is install_generation_watcher()'s result from before the Run click.
+    """
+    print("    ⏳ Waiting for generation to complete...")
+
+    if not await wait_generation_state(page, watching, wa.GENERATION_STARTED_JS, True,
+                                       wa.GENERATION_START_TIMEOUT_MS):
+        print("    ⚠️ No generation detected. Moving on...")
+        return False
+
+    print("    🔄 Generation in progress...")
+    if await wait_generation_state(page, watching, wa.GENERATION_DONE_JS, False, wa.GENERATION_TIMEOUT_MS):
+        print("    ✅ Generation complete!")
+    else:
+        print(f"    ⚠️ Generation still running after {wa.GENERATION_TIMEOUT_MS // 1000}s. Moving on...")
+    return True
+
+async def detect_throttling(page):
+    try:
+        message = await page.evaluate(wa.THROTTLE_MESSAGE_JS, wa.THROTTLE_TEXTS)
+    except Exception:
+        message = None
+    return wa.throttle_reason(page, message)
+
+async def report_browser_resources(pages):
+    """Async version of whisk_automation.report_browser_resources(): the browser once, then each tab."""
+    footprint = wa.process_footprint(wa.BOT_PROFILE_DIR)
+    if footprint:
+        print(f"📈 Browser: {footprint}")
+    for page_id, page in enumerate(pages):
+        try:
+            cdp = await page.context.new_cdp_session(page)
+            await cdp.send("Performance.enable")
+            print(f"[P{page_id + 1}] 📈 {wa.format_page_metrics(await cdp.send('Performance.getMetrics'))}")
+            await cdp.detach()
+        except Exception:
+            pass
+
+async def harvest_results(img_path, img_name, responses):
+    """Async version of whisk_automation.harvest_results(); result bodies are read concurrently."""
+    bodies = await asyncio.gather(*(response.body() for response in responses), return_exceptions=True)
+    read = []
+    for response, body in zip(responses, bodies):
+        if isinstance(body, Exception):
+            print(f"    ⚠️ Couldn't read result {response.url[:80]}: {body}")
+        else:
+            read.append((response, body))
+    return wa.save_results(img_path, img_name, read)
+
+async def clear_section(page, section):
+    header, container = await find_section_container(page, section)
+    if not container:
+        return
+    deleted_any = False
+    for attempt in range(5):  # Handle multiple images per section
+        delete_btn = container.locator(wa.SELECTORS["delete_image"]).first
+        if not await is_visible(delete_btn, 500):
+            break
+        try:
+            handle = await delete_btn.element_handle(timeout=500)
+            await delete_btn.click()
+        except Exception:
+            break
+        print(f"    ✅ Deleted image from '{section}'.")
+        deleted_any = True
+        await wait_ready("clear", 0.5, lambda t: element_detached(page, handle, t))
+    if deleted_any:
+        return
+
+    # Fallback: try other remove/clear button labels (labels fetched in one evaluate)
+    labels = await container.locator("button, div[role='button']").evaluate_all(
+        "els => els.map(el => (el.getAttribute('aria-label') || '').toLowerCase())")
+    for i, lbl in enumerate(labels):
+        if any(word in lbl for word in ["remove", "clear", "delete", "close"]):
+            btn = container.locator("button, div[role='button']").nth(i)
+            if await is_visible(btn, 200):
+                await btn.click()
+                print(f"    ✅ Cleared '{section}' via '{lbl}'.")
+                return
+
+async def clear_inputs(page):
+    """Async version of whisk_automation.clear_inputs(); the three sections are cleared concurrently."""
+    print("  🧹 Clearing inputs (Subject, Scene, Style)...")
+    results = await asyncio.gather(*(clear_section(page, s) for s in ["Subject", "Scene", "Style"]),
+                                   return_exceptions=True)
+    for section, result in zip(["Subject", "Scene", "Style"], results):
+        if isinstance(result, Exception):
+            print(f"    ⚠️ Error clearing '{section}': {result}")
+
+# ==========================================
+# LOGIN
+# ==========================================
+
+async def sections_visible(page, timeout=300):
+    subject, scene, upload = await asyncio.gather(
+        is_visible(page.locator("h4:has-text('Subject')").first, timeout),
+        is_visible(page.locator("h4:has-text('Scene')").first, timeout),
+        is_visible(page.locator("text=Upload").first, timeout),
+    )
+    return subject or scene or upload
+
+async def login(page):
+    """Async version of whisk_automation.login()."""
+    print("\n" + "="*50)
+    print("🔑  MANUAL LOGIN REQUIRED")
+    print("Please log in with your Google account in the browser window.")
+    print("="*50 + "\n")
+
+    print("    🔍 Checking if already logged in...")
+    await page.wait_for_timeout(3000)
+    if await is_visible(page.locator("h4:has-text('Subject')").first, 3000):
+        print("    ✅ Already logged in! Sections visible. Skipping login.")
+        return
+
+    if "accounts.google" in (urlparse(page.url).hostname or ""):
+        print("    ⏳ Waiting for you to finish logging in...")
+        print("    (You only need to do this ONCE — your session will be saved)\n")
+
+    for attempt in range(180):  # Wait up to ~6 minutes
+        hostname = urlparse(page.url).hostname or ""
+        if await sections_visible(page):
+            print(f"    ✅ Whisk UI detected! Sections are visible.")
+            return
+        if "labs.google" in hostname and "accounts.google" not in hostname:
+            print(f"    ✅ On Whisk page: {page.url[:80]}")
+            break
+        if attempt % 15 == 0 and attempt > 0:
+            print(f"    ⏳ Still waiting... ({attempt * 2}s elapsed)")
+        await asyncio.sleep(2)
+    else:
+        print("    ⚠️ Timed out waiting for Whisk page. Continuing anyway...")
+
+    print("    ⏳ Waiting for Whisk UI to fully load...")
+    await page.wait_for_timeout(5000)
+
+    print("    👀 Checking for onboarding modals...")
+    for i in range(5):
+        continue_btn = page.get_by_role("button", name="CONTINUE").first
+        modal_checks = [is_visible(page.locator(f"text={mt}").first, 1000)
+                        for mt in ["Precise Mode", "What's new", "Welcome"]]
+        continue_visible, *modals = await asyncio.gather(is_visible(continue_btn, 2000), *modal_checks)
+        try:
+            if continue_visible:
+                print(f"    👋 Clicking 'CONTINUE' button...")
+                await continue_btn.click()
+                await page.wait_for_timeout(3000)
+                continue
+            if any(modals):
+                print(f"    👋 Found onboarding modal. Closing...")
+                close_btn = page.locator("button[aria-label='Close'], button[aria-label='close']").first
+                if await is_visible(close_btn, 1000):
+                    await close_btn.click()
+                else:
+                    await page.keyboard.press("Escape")
+                await page.wait_for_timeout(2000)
+        except Exception:
+            pass
+        if await is_visible(page.locator("h4:has-text('Subject')").first, 1000):
+            print("    ✅ Whisk UI loaded — sections visible.")
+            return
+        await asyncio.sleep(1)
+
+    print("    👀 Sections not visible yet. Trying to open sidebar...")
+    toggles = [page.get_by_role("button", name=re.compile(pattern, re.IGNORECASE)).first
+               for pattern in ["expand", "open sidebar", "show tool", "show project", "panel"]]
+    visible = await asyncio.gather(*(is_visible(btn, 1000) for btn in toggles))
+    sidebar_opened = False
+    for btn, is_shown in zip(toggles, visible):
+        if is_shown:
+            await btn.click()
+            await page.wait_for_timeout(3000)
+            sidebar_opened = True
+            break
+
+    if not sidebar_opened:
+        try:
+            snapshot = await page.evaluate(wa.SNAPSHOT_JS, "button")
+            for b in wa.sidebar_toggle_candidates(snapshot):
+                print(f"    👉 Trying left-side button at y={b['box']['y']:.0f}...")
+                await wa.snapshot_locator(page, b).click()
+                await page.wait_for_timeout(3000)
+                if await is_visible(page.locator("text=Subject").first, 2000):
+                    print("    ✅ Sidebar opened!")
+                    break
+        except Exception:
+            pass
+
+    print("    ⏳ Verifying sections are visible...")
+    try:
+        await page.locator("h4:has-text('Subject')").first.wait_for(state="visible", timeout=60000)
+        print("    ✅ Ready! Subject/Scene/Style sections visible.")
+    except Exception:
+        print("    ⚠️ Could not verify sections. Proceeding anyway...")
+
+# ==========================================
+# MAIN LOOP
+# ==========================================
+
+async def process_image(page, img_path, img_name, worker):
+    """Async version of whisk_automation.process_image(). Returns the same result dict."""
+    job = {"worker": worker, "image": img_name, "timings": {}}
+    failed_sections = []
+    ordered_sections = [s for s in ["Subject", "Scene", "Style"] if wa.UPLOAD_SECTIONS.get(s, True)]
+    # Manifest jobs can use a different file per section (or none); inputs are still cleared every time
+    files = wa.section_files(img_path)
+    wanted = {section: wa.upload_path_for(files[section]) for section in ordered_sections if files[section]}
+
+    async with phase_timer("upload", job):
+        shared_files = {}
+        if wa.SHARED_UPLOAD:
+            for upload_path in set(wanted.values()):
+                try:
+                    payload = await in_thread(wa.read_file_for_staging, upload_path)
+                    shared_files[upload_path] = await page.evaluate_handle(wa.STAGE_FILE_JS, payload)
+                except Exception as e:
+                    print(f"    ⚠️ Could not stage file in page, uploading per section: {e}")
+        try:
+            for section, upload_path in wanted.items():
+                if not await upload_image(page, section, upload_path, job, shared_file=shared_files.get(upload_path)):
+                    print(f"    ⚠️ Upload to '{section}' failed, but proceeding anyway...")
+                    failed_sections.append(section)
+        finally:
+            for shared_file in shared_files.values():
+                try:
+                    await shared_file.dispose()
+                except Exception:
+                    pass
+
+    async with phase_timer("pre_run", job):
+        print("    ⏳ Waiting for uploads to finish and Run to be enabled...")
+        await wait_ready("pre_run", 12,
+                         lambda t: uploads_idle(page, t),
+                         lambda t: run_button_enabled(page, t))
+
+    if wa.RUN_PACING:
+        async with phase_timer("run_pacing", job):
+            await asyncio.sleep(wa.reserve_run_slot())
+    wa.begin_result_capture(page)
+    wa.begin_throttle_watch(page)
+    await wait_previous_generation(page)
+    watching = await install_generation_watcher(page)  # Before the click, so a quick start/stop isn't missed
+    clicked = await run_generation(page, job)
+
+    generation_started = time.time()
+    async with phase_timer("generation_wait", job) as rec:
+        generated = await wait_for_generation(page, watching)
+        rec["ok"] = generated
+
+    throttled = await detect_throttling(page) if clicked else None
+    if throttled:
+        print(f"    🚦 Throttling detected ({throttled}). Slowing down Run clicks.")
+    if clicked and wa.RUN_PACING:
+        wa.record_run_outcome(wa.run_outcome(generated, throttled), time.time() - generation_started)
+
+    responses = wa.end_result_capture(page)
+    results = []
+    if generated and wa.RESULTS_DIR:
+        async with phase_timer("harvest", job):
+            results = await harvest_results(img_path, img_name, responses)
+
+    async with phase_timer("cleanup", job):
+        try:
+            async with phase_timer("clear_inputs", job):
+                await clear_inputs(page)
+            print("    ⏳ Stabilizing UI after cleanup...")
+            await wait_ready("post_clear", 5,
+                             lambda t: inputs_cleared(page, t),
+                             lambda t: uploads_idle(page, t))
+        except Exception:
+            pass
+        await wait_ready("cooldown", 2, lambda t: stop_button_gone(page, t))
+
+    timings = {phase: round(seconds, 3) for phase, seconds in job["timings"].items()}
+    if generated:
+        reason = f"upload failed for {', '.join(failed_sections)}" if failed_sections else ""
+        return {"status": "done", "reason": reason, "timings": timings, "results": results}
+    if not clicked:
+        reason = "Run button click failed"
+    elif throttled:
+        reason = f"throttled: {throttled}"
+    elif failed_sections:
+        reason = f"no generation detected (upload failed for {', '.join(failed_sections)})"
+    else:
+        reason = "no generation detected"
+    return {"status": "failed", "reason": reason, "timings": timings}
+
+async def run_page_worker(page_id, page, job_queue, progress, journal):
+    """One tab: keeps pulling jobs from the shared queue until it gets the None sentinel."""
+    tag = f"[P{page_id + 1}]"
+    processed = 0
+    while True:
+        job = await in_thread(job_queue.get)
+        if job is None:
+            break
+        img_path, img_name = job
+
+        with progress["lock"]:
+            progress["done"] += 1
+            position = progress["done"]
+            total = f"{progress['total']}{'+' if progress['feeding'] else ''}"
+        print(f"{tag} [{position}/{total}] Processing: {img_name}")
+
+        try:
+            entry = await in_thread(wa.journal_entry, img_path, journal, worker=page_id + 1)
+        except OSError as e:
+            print(f"    ⚠️ Skipping {img_name}: {e}")  # File vanished before we got to it
+            wa.finish_job(progress)
+            continue
+        await in_thread(wa.journal_append, dict(entry, status="started"))
+        try:
+            result = await process_image(page, img_path, img_name, page_id + 1)
+        except Exception as e:
+            await in_thread(wa.journal_append, dict(entry, status="failed", reason=f"error: {e}"))
+            wa.record_job_outcome({"status": "failed"})
+            print(f"{tag} ❌ {img_name}: {e}")
+            wa.finish_job(progress)
+            continue
+        await in_thread(wa.journal_append, dict(entry, **result))
+        wa.record_job_outcome(result)
+        wa.finish_job(progress)
+        processed += 1
+    print(f"{tag} ✅ Tab finished — {processed} image(s) processed.")
+
+async def run(args):
+    journal = wa.load_journal()
+    images = wa.build_image_source(args, journal)
+    if images is None:
+        print("No images to process. Exiting.")
+        return 0
+
+    wa.stop_owned_browsers([wa.BOT_PROFILE_DIR])
+    wa.load_strategy_cache()
+
+    page_count = max(1, args.pages)
+    job_queue = queue.Queue()
+    progress = {"done": 0, "finished": 0, "total": 0, "feeding": True, "lock": threading.Lock()}
+    threading.Thread(target=wa.feed_jobs, args=(images, job_queue, progress, page_count),
+                     name="whisk-feeder", daemon=True).start()
+
+    print(f"🔌 Launching Browser (Persistent Profile: {wa.BOT_PROFILE_DIR})...")
+    from playwright.async_api import async_playwright
+
+    async with async_playwright() as p:
+        context = await p.chromium.launch_persistent_context(**wa.browser_launch_options(wa.BOT_PROFILE_DIR))
+        wa.record_browser_pid(wa.BOT_PROFILE_DIR)
+        if wa.LEAN_BROWSER:
+            await wa.block_nonessential_requests(context)
+        try:
+            # Log in once on the first tab; the other tabs share the session
+            first = context.pages[0] if context.pages else await context.new_page()
+            pages = [first] + [await context.new_page() for _ in range(page_count - 1)]
+            for page in pages:
+                wa.install_readiness_tracking(page)
+                wa.install_result_harvester(page)
+                wa.install_throttle_detection(page)
+
+            print(f"🌐 Navigating to {wa.WHISK_URL}...")
+            try:
+                await first.goto(wa.WHISK_URL, timeout=60000)
+            except Exception as nav_err:
+                print(f"    ⚠️ Navigation warning: {nav_err}")
+            await login(first)
+            if len(pages) > 1:
+                print(f"🗂️ Opening {len(pages) - 1} more tab(s)...")
+                navigations = await asyncio.gather(*(page.goto(wa.WHISK_URL, timeout=60000) for page in pages[1:]),
+                                                   return_exceptions=True)
+                for nav_err in navigations:
+                    if isinstance(nav_err, Exception):
+                        print(f"    ⚠️ Navigation warning: {nav_err}")
+                await asyncio.gather(*(login(page) for page in pages[1:]))
+
+            print(f"\n🏁 Starting Image Processing Loop ({len(pages)} tab(s))\n")
+            await asyncio.gather(*(run_page_worker(i, page, job_queue, progress, journal)
+                                   for i, page in enumerate(pages)))
+            await report_browser_resources(pages)
+        finally:
+            await context.close()
+
+    exit_code = wa.finish_run(progress)
+    wa.flush_result_writer()
+    wa.print_run_reports()
+    return exit_code
+
+def main(argv=None):
+    parser = wa.build_arg_parser("Whisk Automation Bot (async engine)")
+    parser.add_argument("--pages", type=int, default=PAGE_COUNT,
+                        help=f"number of Whisk tabs driven concurrently (default {PAGE_COUNT})")
+    argv = sys.argv[1:] if argv is None else argv
+    args = parser.parse_args(argv)
+    wa.apply_config(args.config)
+    shards = args.shards or wa.SHARD_COUNT
+    if shards > 1 and not args.shard and not args.dry_run:
+        return 1 if wa.run_shards(shards, argv, script=__file__) else 0
+    wa.apply_shard_args(args)
+    wa.apply_browser_args(args)
+    wa.apply_run_args(args)
+    if args.dry_run:
+        return wa.list_jobs(args)
+    print("🚀 Starting Whisk Automation (async)...")
+    return asyncio.run(run(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
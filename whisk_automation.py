@@ -1,9 +1,38 @@
 import os
+import sys
+import csv
+import json
 import time
+import hashlib
+import base64
+import mimetypes
+import argparse
+import itertools
+import functools
 import re
+import queue
+import shutil
+import signal
+import socket
 import subprocess
+import threading
 from urllib.parse import urlparse
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+# Playwright is imported where a browser is actually started, so listing/status commands stay instant
+
+try:
+    # Optional: only needed for NORMALIZE_IMAGES
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+try:
+    # Optional: only needed for the per-browser memory/CPU report
+    import psutil
+except ImportError:
+    psutil = None
 
 # ==========================================
 # CONFIGURATION
@@ -17,6 +46,10 @@ BOT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "whis
 IMAGES_FOLDER_1 = r"C:\Users\Muhammad Ikram\Desktop\Playwrite Bot\test_images"  # Person 1
 IMAGES_FOLDER_2 = r"D:\test images"  # Person 2
 
+# Chrome to launch. If it isn't there (e.g. on Linux) Playwright's own Chromium is used
+# (install it once with: playwright install chromium)
+CHROME_EXECUTABLE = r"C:\Program Files\Google\Chrome\Application\chrome.exe"
+
 # Whisk Lab URL
 WHISK_URL = "https://labs.google/fx/tools/whisk/project"
 
@@ -27,74 +60,907 @@ SELECTORS = {
     "run_button": "Run",  # Text on the generate button
     "loading_indicator": "Generating...", # Text or state indicating work in progress
     "result_container": ".result-image-container", # Generic class placeholder - update if known
+    "stop_button": "button[aria-label*='Stop'], button[aria-label*='Cancel']",
+    "delete_image": "button[aria-label='Delete image']",
 }
 
+# Labels (aria-label or visible text) the Run/Generate button has been seen with
+RUN_BUTTON_LABELS = ["Run", "Generate", "Whisk", "Whisk it", "Submit", "Create image"]
+
+# Texts that identify the Run button when it has no matching aria-label
+RUN_BUTTON_TEXTS = ["Whisk it", "Run", "Generate", "Create"]
+
+# Bottom-area buttons that are never the Run button (matched against aria-label)
+RUN_SKIP_LABELS = ["stop", "cancel", "delete", "download", "aspect", "inspire",
+                   "add new", "category", "refine", "select", "menu", "close",
+                   "expand", "collapse"]
+
+# Readiness waits — instead of fixed sleeps we wait for a real DOM/network signal
+# (thumbnail shown, upload request finished, Run enabled, Stop gone). A phase waits at most
+# READY_TIMEOUT_FACTOR times its old fixed sleep, and never longer than READY_TIMEOUT_MS.
+# If a signal isn't available we fall back to the old fixed sleep.
+READY_TIMEOUT_MS = 15000
+READY_TIMEOUT_FACTOR = 3
+READY_GIVE_UP_AFTER = 3  # A phase whose signal times out this many times in a row goes straight to the fallback...
+READY_RETRY_EVERY = 20   # ...but tries the signal again every N waits, in case it comes back
+
+# Generation completion — an in-page MutationObserver reports when the Stop button /
+# "Generating" indicator appears and disappears, so we react the moment it changes.
+# If the observer can't be installed we poll instead, backing off between the two intervals.
+GENERATION_START_TIMEOUT_MS = 15000   # Give up if the generation hasn't started by then
+GENERATION_TIMEOUT_MS = 180000        # Longest a single generation may run
+GENERATION_POLL_MIN_SECONDS = 0.25    # Fallback polling: first interval...
+GENERATION_POLL_MAX_SECONDS = 2.0     # ...doubling up to this
+
+# Run pacing — Run clicks from all workers go through one shared token bucket. The rate adapts
+# to how the service responds (AIMD): every clean generation raises it a little; throttling
+# (HTTP 429, a "quota"/"try again" message) cuts it and pauses everyone. A click without a
+# generation is neutral — only a streak of them counts as a (silent) throttle.
+RUN_PACING = True
+RUN_RATE_PER_MINUTE = 6.0        # Starting rate
+RUN_RATE_MIN_PER_MINUTE = 0.5
+RUN_RATE_MAX_PER_MINUTE = 30.0
+RUN_RATE_INCREASE = 0.5          # Added (per minute) after each clean generation
+RUN_RATE_DECREASE = 0.5          # Rate multiplier on throttling
+RUN_BURST = 1                    # Clicks allowed back-to-back before pacing kicks in
+RUN_NO_GENERATION_STREAK = 3     # Cut the rate after this many Run clicks in a row without a generation
+RUN_SLOW_FACTOR = 2.0            # A generation this many times slower than usual also counts as a warning
+THROTTLE_PAUSE_SECONDS = 60      # Pause after throttling (doubles while it keeps happening, up to 8x)
+THROTTLE_STATUS_CODES = (429,)
+THROTTLE_TEXTS = ["quota", "try again", "too many requests", "rate limit", "unusual traffic",
+                  "something went wrong"]
+
+# Upload strategy cache — remembers which upload path worked per section so the next
+# upload tries it first. Set to None to keep the cache in memory only (no file).
+STRATEGY_CACHE_FILE = os.path.join(os.path.dirname(BOT_PROFILE_DIR), "upload_strategy_cache.json")
+
+# Image types picked up from the folders
+SUPPORTED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+# Watch mode (--watch) — how often to look for newly dropped images
+WATCH_POLL_SECONDS = 5
+
+# Batch manifest (--manifest FILE) — a CSV (columns subject, scene, style and optional name) or
+# JSONL file with one job per row, so each section can get a different image. An empty cell leaves
+# that section empty; relative paths are relative to the manifest. Sections that keep the same
+# image from one job to the next are not cleared or re-uploaded, and with MANIFEST_REORDER the
+# jobs are sorted so that happens as often as possible.
+MANIFEST_REORDER = True
+
+# Job journal — every image's status/timings are appended here so a crashed or stopped run
+# can be continued with --resume (skip done) or --retry-failed. None disables the journal.
+JOURNAL_FILE = os.path.join(os.path.dirname(BOT_PROFILE_DIR), "whisk_journal.jsonl")
+
+# Skip images whose exact content was already queued this run or generated before
+# (e.g. the same picture in both folders under different names). --allow-duplicates overrides.
+DEDUPE_IMAGES = True
+
+# Which sections receive the image (set one to False to leave that section alone)
+UPLOAD_SECTIONS = {"Subject": True, "Scene": True, "Style": True}
+
+# Send each image to the page once and give the same in-page File to every section,
+# instead of a separate file transfer per section. Off by default until proven on the live UI;
+# an assignment the page doesn't accept falls back to the normal upload strategies.
+SHARED_UPLOAD = False
+
+# Pipelining — once image N is generating, take image N+1 from the queue and prepare it
+# (hash, file bytes) in the background so its upload starts the moment N is done
+PIPELINE_NEXT_IMAGE = True
+
+# Pre-upload normalization — shrink/re-encode big inputs before they go to the browser.
+# Needs Pillow (pip install Pillow). Results are cached in NORMALIZE_CACHE_DIR by content hash.
+NORMALIZE_IMAGES = False
+NORMALIZE_MAX_SIDE = 2048          # Longest side in pixels
+NORMALIZE_FORMAT = "JPEG"          # "JPEG", "PNG" or "WEBP"
+NORMALIZE_QUALITY = 90             # JPEG/WEBP quality
+NORMALIZE_SKIP_UNDER_BYTES = 1_500_000  # Small enough already? Upload the original as-is
+NORMALIZE_PROCESSES = None         # None = one per CPU core
+NORMALIZE_CACHE_DIR = os.path.join(os.path.dirname(BOT_PROFILE_DIR), "normalized_cache")
+
+# Metrics — one JSON line per timed phase (section lookup, delete, upload strategy, waits,
+# run click, generation, cleanup). A p50/p95/max summary is printed at the end. None disables the file.
+METRICS_FILE = os.path.join(os.path.dirname(BOT_PROFILE_DIR), "whisk_metrics.jsonl")
+
+# Result harvesting — generated images are captured from the page's network responses (the
+# actual image bytes, not screenshots) and saved to RESULTS_DIR/<input image name>/ by a
+# background writer, with one line per file in RESULTS_DIR/manifest.jsonl. None disables it.
+RESULTS_DIR = os.path.join(os.path.dirname(BOT_PROFILE_DIR), "whisk_results")
+RESULT_MIN_BYTES = 10_000   # Smaller images (icons, avatars) are not results
+RESULT_URL_PATTERN = None   # Optional regex a result image URL must match
+
+# Sharding — run several independent bot processes on one machine (--shards N), each with its
+# own Chrome profile and so its own Google account. Images are split by a hash of their path,
+# so an image always goes to the same shard. Shard i uses SHARD_PROFILE_DIRS[i] if listed,
+# otherwise BOT_PROFILE_DIR (shard 1) / BOT_PROFILE_DIR + "_shard<i>" — log in once in each.
+SHARD_COUNT = 1
+SHARD_PROFILE_DIRS = []
+
+# Worker pool — how many Whisk pages process images at the same time.
+# 1 = classic single-page mode. Each extra worker runs its own Chrome with a copy
+# of BOT_PROFILE_DIR (seeded once, so you don't have to log in again).
+WORKER_COUNT = 1
+
+# Browser footprint — pack more workers per machine.
+# LEAN_BROWSER (--lean) blocks requests the bot doesn't need: analytics/ads, web fonts, audio/video.
+# HEADLESS (--headless) runs Chrome without a window; sign in once with a window first.
+LEAN_BROWSER = False
+HEADLESS = False
+BLOCKED_URL_PATTERNS = [
+    r"^https?://([^/]*\.)?(google-analytics\.com|googletagmanager\.com|doubleclick\.net|googlesyndication\.com|googleadservices\.com)/",
+    r"^https?://fonts\.(googleapis|gstatic)\.com/",
+    r"\.(woff2?|ttf|otf|eot)(\?|$)",
+    r"\.(mp4|webm|ogg|mp3|m4a|wav)(\?|$)",
+]
+RESOURCE_REPORT_EVERY = 25  # Print browser memory/CPU every N images (0 = only at the end)
+
+# Browser recovery — if Chrome crashes or stops responding mid-batch, the worker kills it,
+# relaunches and retries the same image, up to this many times per worker
+MAX_BROWSER_RESTARTS = 3
+
+# Watchdog — after every image, check that the Subject/Scene/Style sections and the Run button
+# are still usable. If not, recover step by step (reload → sidebar/modal handling from login →
+# relaunch the browser) and process the affected image again.
+WATCHDOG = True
+WATCHDOG_STEP_TIMEOUT_MS = 20000  # How long each recovery step gets to bring the page back
+
+# Settings file / environment — any setting above can also be set in a JSON file
+# ({"IMAGES_FOLDER_1": "D:/in", "WORKER_COUNT": 2}; --config FILE, $WHISK_CONFIG or
+# whisk_config.json next to this script) or as a WHISK_<NAME> environment variable.
+# Precedence: command-line flags > environment > config file > the values above.
+# Paths derived from BOT_PROFILE_DIR above (journal, cache, results...) don't follow it; set them too.
+SETTING_NAMES = sorted(name for name in list(globals()) if name.isupper())
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "whisk_config.json")
+ENV_PREFIX = "WHISK_"
+
 # ==========================================
 # FUNCTIONS
 # ==========================================
 
-def kill_existing_chrome():
-    """Force kills any running Chrome instances to free up the profile."""
-    print("🔪 Killing existing Chrome processes to avoid profile locks...")
+# ==========================================
+# METRICS
+# ==========================================
+# Every timed phase becomes one JSON line in METRICS_FILE:
+#   {"ts", "worker", "image", "phase", "seconds", "ok", ...extra fields}
+# and is kept in memory for the end-of-run summary (p50/p95/max per phase, images/hour).
+
+_METRICS = {"phases": {}, "images": 0, "failed": 0, "started": time.time()}
+_METRICS_LOCK = threading.Lock()
+_METRICS_CONTEXT = threading.local()  # worker, image, per-image timings, open phase stack
+
+def set_metrics_worker(worker):
+    """Tags this thread's metrics with a worker number."""
+    _METRICS_CONTEXT.worker = worker
+
+def begin_image_metrics(img_name):
+    """Starts collecting per-image phase timings on this thread."""
+    _METRICS_CONTEXT.image = img_name
+    _METRICS_CONTEXT.timings = {}
+
+def end_image_metrics():
+    """Finishes the current image. Returns its {phase: seconds} timings (summed per phase)."""
+    timings = {phase: round(seconds, 3) for phase, seconds in getattr(_METRICS_CONTEXT, "timings", {}).items()}
+    _METRICS_CONTEXT.image = None
+    _METRICS_CONTEXT.timings = {}
+    return timings
+
+def record_job_outcome(result):
+    """
+    Counts a job's final result (the one that goes to the journal) for the summary and the exit
+    code — once per job, so a retry after a browser restart or a watchdog redo isn't counted twice.
+    """
+    with _METRICS_LOCK:
+        _METRICS["images"] += 1
+        _METRICS["failed"] += 0 if result.get("status") == "done" else 1
+
+def note_phase(**fields):
+    """Adds fields (e.g. which strategy won) to the innermost phase currently being timed."""
+    stack = getattr(_METRICS_CONTEXT, "stack", None)
+    if stack:
+        stack[-1].update(fields)
+
+def record_phase(phase, seconds, ok=True, **fields):
+    """Stores one phase measurement and appends it to METRICS_FILE."""
+    timings = getattr(_METRICS_CONTEXT, "timings", None)
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+    line = dict(ts=round(time.time(), 3), worker=getattr(_METRICS_CONTEXT, "worker", None),
+                image=getattr(_METRICS_CONTEXT, "image", None), phase=phase,
+                seconds=round(seconds, 4), ok=ok)
+    line.update(fields)  # May override worker/image (the async engine has no per-thread context)
+    with _METRICS_LOCK:
+        _METRICS["phases"].setdefault(phase, []).append(seconds)
+        if METRICS_FILE:
+            try:
+                with open(METRICS_FILE, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(line, ensure_ascii=False) + "\n")
+            except OSError:
+                pass
+
+@contextmanager
+def phase_timer(phase, **fields):
+    """
+    Times a block as `phase`. Yields a dict: set rec["ok"] = False to mark the phase failed,
+    or add any extra fields to log with it. An exception marks it failed too.
+    """
+    rec = dict(fields)
+    stack = getattr(_METRICS_CONTEXT, "stack", None)
+    if stack is None:
+        stack = _METRICS_CONTEXT.stack = []
+    stack.append(rec)
+    started = time.time()
+    ok = True
+    try:
+        yield rec
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        stack.pop()
+        ok = bool(rec.get("ok", True)) and ok
+        record_phase(phase, time.time() - started, ok=ok, **{k: v for k, v in rec.items() if k != "ok"})
+
+def timed(phase):
+    """Decorator version of phase_timer()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase_timer(phase):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+def print_metrics_summary():
+    """Prints p50/p95/max per phase and overall images/hour."""
+    with _METRICS_LOCK:
+        phases = {phase: sorted(values) for phase, values in _METRICS["phases"].items()}
+        images, failed = _METRICS["images"], _METRICS["failed"]
+        elapsed = time.time() - _METRICS["started"]
+    if not phases:
+        return
+    print("\n📊 Phase timings (seconds):")
+    print(f"    {'phase':<24} {'count':>6} {'p50':>8} {'p95':>8} {'max':>8}")
+    for phase, values in sorted(phases.items()):
+        print(f"    {phase:<24} {len(values):>6} {percentile(values, 0.5):>8.2f} "
+              f"{percentile(values, 0.95):>8.2f} {values[-1]:>8.2f}")
+    per_hour = images / elapsed * 3600 if elapsed > 0 else 0
+    print(f"    Images: {images} ({failed} failed) in {elapsed / 60:.1f} min — {per_hour:.1f} images/hour")
+    if METRICS_FILE:
+        print(f"    Details: {METRICS_FILE}")
+
+# ==========================================
+# BROWSER PROCESSES
+# ==========================================
+# The bot only ever touches Chrome processes it launched itself: the browser PID is written to
+# PID_FILE_NAME inside the profile after launch, and leftovers are found by that PID or by the
+# --user-data-dir of our own profiles. Your normal Chrome and other shards are left alone.
+
+PID_FILE_NAME = "whisk_bot.pid"
+PROFILE_LOCK_FILES = ("SingletonLock", "SingletonSocket", "SingletonCookie", "lockfile")
+
+def pid_alive(pid):
+    """True if `pid` is running (an exited process waiting to be reaped doesn't count)."""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+        except psutil.Error:
+            return False
+    if os.name == "nt":
+        out = subprocess.run(["tasklist", "/FI", f"PID eq {pid}", "/NH"], capture_output=True, text=True)
+        return str(pid) in out.stdout
     try:
-        subprocess.run(["taskkill", "/F", "/IM", "chrome.exe", "/T"], 
-                      stdout=subprocess.DEVNULL, 
-                      stderr=subprocess.DEVNULL)
-        time.sleep(2) # Wait for file locks to release
-    except Exception as e:
-        print(f"⚠️ Could not kill Chrome: {e}")
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except (OSError, IndexError):
+        return True
 
-def load_images(folder_paths):
+def pid_owns_profile(pid, profile_dir):
+    """True if process `pid` is a Chrome running on `profile_dir` (guards against reused PIDs)."""
+    marker = "--user-data-dir=" + os.path.abspath(profile_dir)
+    try:
+        if psutil is not None:
+            cmdline = psutil.Process(pid).cmdline()
+        elif os.path.exists(f"/proc/{pid}/cmdline"):
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read().decode("utf-8", "replace").split("\0")
+        else:
+            return False  # Can't check (Windows without psutil) — the command-line match below covers it
+    except Exception:
+        return False
+    return any(arg.strip('"') == marker for arg in cmdline)
+
+def kill_pid(pid):
+    """Force kills a process and its children."""
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(pid)],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30)
+        return
+    if psutil is not None:
+        try:
+            proc = psutil.Process(pid)
+            for child in proc.children(recursive=True):
+                child.kill()
+            proc.kill()
+        except psutil.Error:
+            pass
+        return
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+def read_browser_pid(profile_dir):
+    try:
+        with open(os.path.join(profile_dir, PID_FILE_NAME), encoding="utf-8") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+def running_browser_pid(profile_dir):
+    """PID of the bot's Chrome still running on `profile_dir`, or None."""
+    pid = read_browser_pid(profile_dir)
+    if pid and pid_alive(pid) and pid_owns_profile(pid, profile_dir):
+        return pid
+    return None
+
+def record_browser_pid(profile_dir):
     """
-    Reads all supported image files from multiple directories and sorts them.
-    Returns a list of (full_path, filename) tuples.
+    Remembers the PID of the Chrome we just launched on `profile_dir`: from Chrome's
+    SingletonLock ("host-PID") on Linux/macOS, or via psutil. Returns the PID or None.
+    """
+    pid = None
+    try:
+        host, _, lock_pid = os.readlink(os.path.join(profile_dir, "SingletonLock")).rpartition("-")
+        pid = int(lock_pid)
+    except (OSError, ValueError, AttributeError):
+        if psutil is not None:
+            procs = browser_processes(profile_dir)
+            pid = procs[0].pid if procs else None
+    if pid:
+        try:
+            with open(os.path.join(profile_dir, PID_FILE_NAME), "w", encoding="utf-8") as f:
+                f.write(str(pid))
+        except OSError:
+            pass
+    return pid
+
+def kill_profile_processes(profile_dir):
+    """Kills any Chrome whose command line has --user-data-dir set to `profile_dir`."""
+    # Matches the --user-data-dir argument Playwright launches Chrome with
+    pattern = '--user-data-dir="?' + re.escape(os.path.abspath(profile_dir)) + '("|\\s|$)'
+    if os.name == "nt":
+        script = ("Get-CimInstance Win32_Process -Filter \"Name = 'chrome.exe'\" | "
+                  f"Where-Object {{ $_.CommandLine -match '{pattern.replace(chr(39), chr(39) * 2)}' }} | "
+                  "ForEach-Object { Stop-Process -Id $_.ProcessId -Force -ErrorAction SilentlyContinue }")
+        cmd = ["powershell", "-NoProfile", "-Command", script]
+    else:
+        cmd = ["pkill", "-9", "-f", "--", pattern]
+    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30)
+
+def clear_stale_profile_locks(profile_dir):
+    """
+    Removes Chrome's profile lock files if the Chrome that created them is gone (crash, reboot,
+    profile copied from another machine). Otherwise the next launch hangs until its 60s timeout.
     """
-    supported_extensions = ('.png', '.jpg', '.jpeg', '.webp')
-    all_images = []
+    lock_path = os.path.join(profile_dir, "SingletonLock")
+    if os.path.islink(lock_path):
+        host, _, pid = os.readlink(lock_path).rpartition("-")
+        if host == socket.gethostname() and pid.isdigit() and pid_alive(int(pid)):
+            return False  # Still held by a running Chrome
+    removed = False
+    for name in PROFILE_LOCK_FILES:
+        path = os.path.join(profile_dir, name)
+        if os.path.lexists(path):
+            try:
+                os.remove(path)
+                removed = True
+            except OSError:
+                pass  # Windows keeps "lockfile" open while Chrome runs — it's not stale then
+    if removed:
+        print(f"    🧹 Cleared stale profile lock in {profile_dir}")
+    return removed
+
+def stop_browser(profile_dir, wait_seconds=5):
+    """Stops the Chrome the bot launched on `profile_dir` (if still running) and clears its locks."""
+    pid = read_browser_pid(profile_dir)
+    if pid and pid_alive(pid) and pid_owns_profile(pid, profile_dir):
+        print(f"    🔪 Stopping leftover bot Chrome (PID {pid}) on {profile_dir}")
+        kill_pid(pid)
+    try:
+        kill_profile_processes(profile_dir)
+    except Exception as e:
+        print(f"⚠️ Could not kill Chrome on {profile_dir}: {e}")
 
-    for folder_path in folder_paths:
-        if not os.path.exists(folder_path):
+    # Wait for the processes to actually exit instead of a fixed sleep
+    deadline = time.time() + wait_seconds
+    while pid and pid_alive(pid) and time.time() < deadline:
+        time.sleep(0.1)
+    if os.path.isdir(profile_dir):
+        clear_stale_profile_locks(profile_dir)
+
+def stop_owned_browsers(profile_dirs):
+    """Ensures none of our profiles is still open in a leftover bot Chrome before launching."""
+    print("🔪 Closing leftover bot Chrome processes (your own Chrome is not touched)...")
+    for profile_dir in profile_dirs:
+        stop_browser(profile_dir)
+
+def resolve_path(path):
+    """Absolute, symlink-free path, so the journal matches no matter which directory the bot runs from."""
+    return os.path.realpath(os.path.expanduser(path))
+
+def iter_images(folder_paths):
+    """
+    Yields (full_path, filename) for every supported image, folder by folder.
+    Each folder is listed once with os.scandir and sorted by name for a stable order;
+    its images are yielded right away, before the next folder is even looked at.
+    """
+    for folder_path in map(resolve_path, folder_paths):
+        if not os.path.isdir(folder_path):
             print(f"⚠️ Image folder not found at {folder_path}, skipping...")
             continue
 
-        images = [f for f in os.listdir(folder_path) if f.lower().endswith(supported_extensions)]
-        images.sort()
+        with os.scandir(folder_path) as entries:
+            images = sorted(e.name for e in entries
+                            if e.name.lower().endswith(SUPPORTED_EXTENSIONS) and e.is_file())
         print(f"📂 Found {len(images)} images in {folder_path}")
         for img in images:
-            all_images.append((os.path.join(folder_path, img), img))
+            yield os.path.join(folder_path, img), img
 
+def load_images(folder_paths):
+    """
+    Reads all supported image files from multiple directories and sorts them.
+    Returns a list of (full_path, filename) tuples.
+    """
+    all_images = list(iter_images(folder_paths))
     print(f"📂 Total images to process: {len(all_images)}")
     return all_images
 
+def watch_images(folder_paths, poll_seconds=None):
+    """
+    Yields every existing image (like iter_images), then keeps polling the folders and yields
+    new images as they are dropped in. A new file is only picked up once its size is the same
+    on two polls in a row, so half-copied files are skipped until they're complete. Never returns.
+    """
+    poll_seconds = WATCH_POLL_SECONDS if poll_seconds is None else poll_seconds
+    folder_paths = [resolve_path(folder_path) for folder_path in folder_paths]
+    seen = set()
+    for img_path, img_name in iter_images(folder_paths):
+        seen.add(img_path)
+        yield img_path, img_name
+
+    print(f"👀 Watching for new images (checking every {poll_seconds}s)...")
+    pending = {}  # path -> size at the previous poll
+    while True:
+        time.sleep(poll_seconds)
+        for folder_path in folder_paths:
+            try:
+                with os.scandir(folder_path) as entries:
+                    new_entries = sorted((e for e in entries
+                                          if e.path not in seen
+                                          and e.name.lower().endswith(SUPPORTED_EXTENSIONS)
+                                          and e.is_file()),
+                                         key=lambda e: e.name)
+            except OSError:
+                continue  # Folder missing (e.g. drive not mounted yet) — try again next poll
+
+            for entry in new_entries:
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    continue
+                if pending.get(entry.path) == size:
+                    del pending[entry.path]
+                    seen.add(entry.path)
+                    print(f"📥 New image: {entry.name} (in {folder_path})")
+                    yield entry.path, entry.name
+                else:
+                    pending[entry.path] = size
+
+# ==========================================
+# BATCH MANIFEST
+# ==========================================
+
+# Manifest jobs: job path ("<manifest>#<id>") -> {"Subject": file or None, "Scene": ..., "Style": ...}
+JOB_SECTIONS = {}
+MANIFEST_COLUMNS = {"subject": "Subject", "scene": "Scene", "style": "Style"}
+
+def read_manifest_rows(manifest_path):
+    """
+    The rows of a manifest: a CSV file, JSONL (one object per line) or a .json array of objects.
+    Lines that aren't valid JSON are reported and left out (as None, so row numbers still match).
+    """
+    with open(manifest_path, newline="", encoding="utf-8-sig") as f:
+        if manifest_path.lower().endswith(".json"):
+            rows = json.load(f)
+            if not isinstance(rows, list):
+                raise ValueError("a .json manifest must be an array of objects")
+            return rows
+        if not manifest_path.lower().endswith(".jsonl"):
+            return list(csv.DictReader(f))
+        rows = []
+        for number, line in enumerate((line for line in f if line.strip()), 1):
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                print(f"    ⚠️ Manifest row {number} isn't valid JSON ({e}), skipping.")
+                rows.append(None)
+        return rows
+
+def read_manifest(manifest_path):
+    """Reads a CSV, JSONL or JSON manifest. Returns [(name, {section: absolute path or None})]."""
+    base = os.path.dirname(resolve_path(manifest_path))
+    try:
+        rows = read_manifest_rows(manifest_path)
+    except (OSError, ValueError) as e:
+        print(f"❌ Can't read manifest {manifest_path}: {e}")
+        return []
+
+    jobs = []
+    for number, row in enumerate(rows, 1):
+        if row is None:
+            continue  # Already reported
+        if not isinstance(row, dict):
+            print(f"    ⚠️ Manifest row {number} isn't an object ({type(row).__name__}), skipping.")
+            continue
+        row = {str(k).strip().lower(): str(v or "").strip() for k, v in row.items() if k}
+        sections = {}
+        for column, section in MANIFEST_COLUMNS.items():
+            value = row.get(column)
+            sections[section] = os.path.normpath(os.path.join(base, os.path.expanduser(value))) if value else None
+        missing = [path for path in sections.values() if path and not os.path.isfile(path)]
+        if missing:
+            print(f"    ⚠️ Manifest row {number}: file not found ({', '.join(missing)}), skipping.")
+            continue
+        if not any(sections.values()):
+            print(f"    ⚠️ Manifest row {number} has no images, skipping.")
+            continue
+        name = row.get("name") or "+".join(os.path.splitext(os.path.basename(path))[0]
+                                           for path in sections.values() if path)
+        jobs.append((name, sections))
+    return jobs
+
+def count_section_uploads(jobs):
+    """How many section uploads a job order needs when unchanged sections are kept."""
+    uploads = 0
+    previous = {}
+    for _, sections in jobs:
+        uploads += sum(1 for section, path in sections.items() if path and previous.get(section) != path)
+        previous = sections
+    return uploads
+
+def order_for_reuse(jobs):
+    """
+    Sorts jobs so consecutive ones share section images: the section with the fewest distinct
+    images is the outermost sort key, and the one that varies most changes on every job.
+    """
+    distinct = {section: len({sections[section] for _, sections in jobs}) for section in MANIFEST_COLUMNS.values()}
+    key_order = sorted(distinct, key=distinct.get)
+    return sorted(jobs, key=lambda job: [job[1][section] or "" for section in key_order])
+
+def iter_manifest(manifest_path):
+    """Yields (job path, job name) for every manifest row and registers its files in JOB_SECTIONS."""
+    jobs = read_manifest(manifest_path)
+    naive = sum(1 for _, sections in jobs for path in sections.values() if path)
+    if MANIFEST_REORDER:
+        jobs = order_for_reuse(jobs)
+    print(f"🧾 Manifest: {len(jobs)} job(s) from {manifest_path} — "
+          f"{count_section_uploads(jobs)} section upload(s) instead of {naive}")
+
+    manifest_abs = resolve_path(manifest_path)
+    for name, sections in jobs:
+        # Same row = same id, even if the manifest is reordered or edited around it (for --resume)
+        row_key = "|".join(f"{section}={sections[section] or ''}" for section in sorted(sections))
+        job_path = f"{manifest_abs}#{hashlib.sha1(row_key.encode('utf-8')).hexdigest()[:12]}"
+        JOB_SECTIONS[job_path] = sections
+        yield job_path, name
+
+def section_files(img_path):
+    """{section: input file or None} for a job — its manifest row, or the same image everywhere."""
+    sections = JOB_SECTIONS.get(img_path)
+    if sections is None:
+        return {section: img_path for section in MANIFEST_COLUMNS.values()}
+    return sections
+
+def job_files(img_path):
+    """The distinct input files a job uploads."""
+    return sorted({path for path in section_files(img_path).values() if path})
+
+# Finds the Subject/Scene/Style headers and containers in one evaluate() and tags them with
+# data-whisk-section(-header) attributes. The result is cached in the page and only recomputed
+# after a MutationObserver sees one of the tagged elements removed (sidebar re-rendered)
+# or after a navigation (window state is gone).
+RESOLVE_SECTIONS_JS = """
+(names) => {
+    const state = window.__whiskSections;
+    if (state && !state.dirty) return state.found;
+
+    const visible = el => { const r = el.getBoundingClientRect(); return r.width > 0 && r.height > 0; };
+    document.querySelectorAll('[data-whisk-section], [data-whisk-section-header]').forEach(el => {
+        el.removeAttribute('data-whisk-section');
+        el.removeAttribute('data-whisk-section-header');
+    });
+
+    const found = {};
+    const elements = [];
+    const tag = (el, attr, name) => {
+        const current = el.getAttribute(attr);
+        el.setAttribute(attr, current ? current + ' ' + name : name);
+        elements.push(el);
+    };
+    for (const name of names) {
+        found[name] = {header: false, container: false};
+        // h4 containing the name first, then any leaf element with exactly that text
+        const lower = name.toLowerCase();
+        let header = [...document.querySelectorAll('h4')].find(h =>
+            visible(h) && (h.textContent || '').toLowerCase().includes(lower));
+        if (!header) {
+            header = [...document.querySelectorAll('body *')].find(el =>
+                el.childElementCount === 0 && (el.textContent || '').trim() === name && visible(el));
+        }
+        if (!header) continue;
+        tag(header, 'data-whisk-section-header', name);
+        found[name].header = true;
+
+        // Walk up to the parent container (needs to be tall enough to contain upload area)
+        let container = header.parentElement;
+        for (let i = 0; i < 6 && container; i++) {
+            if (container.getBoundingClientRect().height > 120) {
+                tag(container, 'data-whisk-section', name);
+                found[name].container = true;
+                break;
+            }
+            container = container.parentElement;
+        }
+    }
+
+    // Only trust the cache once every section was found
+    window.__whiskSections = {found: found, elements: elements, dirty: !names.every(n => found[n].container)};
+    if (!window.__whiskSectionObserver) {
+        window.__whiskSectionObserver = new MutationObserver(() => {
+            const s = window.__whiskSections;
+            if (s && !s.dirty && s.elements.some(el => !el.isConnected)) s.dirty = true;
+        });
+        window.__whiskSectionObserver.observe(document.body, {childList: true, subtree: true});
+    }
+    return found;
+}
+"""
+
+def resolve_sections(page, names=None):
+    """
+    Returns {section: {"header": bool, "container": bool}} for the given sections
+    (default: SELECTORS["sections"]). Served from the in-page cache unless the sidebar re-rendered.
+    """
+    return page.evaluate(RESOLVE_SECTIONS_JS, list(names or SELECTORS["sections"]))
+
+@timed("section_lookup")
 def find_section_container(page, section_name):
     """
     Finds the section header and its parent container for Subject/Scene/Style.
     Returns (header, container) or (None, None).
     """
     try:
-        # Try exact match first, then regex
-        header = page.locator(f"h4:has-text('{section_name}')").first
-        if not header.is_visible(timeout=2000):
-            header = page.get_by_text(section_name, exact=True).first
-        
-        if not header.is_visible(timeout=1000):
-            return None, None
-        
-        # Walk up to find the parent container (needs to be tall enough to contain upload area)
-        container = header.locator("xpath=..")
-        for _ in range(6):
-            try:
-                box = container.bounding_box()
-                if box and box['height'] > 120:
-                    return header, container
-                container = container.locator("xpath=..")
-            except:
-                container = container.locator("xpath=..")
-        
-        return header, None
+        names = list(SELECTORS["sections"])
+        if section_name not in names:
+            names.append(section_name)
+
+        found = resolve_sections(page, names)[section_name]
+        if not found["header"]:
+            # Give the section a moment to render
+            page.wait_for_function(
+                f"({RESOLVE_SECTIONS_JS})({json.dumps(names)})[{json.dumps(section_name)}].header",
+                timeout=2000,
+            )
+            found = resolve_sections(page, names)[section_name]
+
+        header = page.locator(f"[data-whisk-section-header~='{section_name}']").first
+        if not found["container"]:
+            return header, None
+        return header, page.locator(f"[data-whisk-section~='{section_name}']").first
     except:
         return None, None
 
+# ==========================================
+# READINESS WAITS
+# ==========================================
+
+# Per-page counters of in-flight upload requests, filled by install_readiness_tracking()
+_UPLOAD_TRACKERS = {}
+
+# Per-phase stats: phase -> {"count", "signalled", "waited", "fallback"} (seconds)
+READY_STATS = {}
+_READY_LOCK = threading.Lock()
+
+def install_readiness_tracking(page):
+    """
+    Counts in-flight upload requests (POST/PUT xhr/fetch) on the page,
+    so uploads_idle() can tell when the browser has finished sending an image.
+    """
+    tracker = {"inflight": 0, "last_change": time.time()}
+
+    def is_upload(request):
+        return request.method in ("POST", "PUT") and request.resource_type in ("xhr", "fetch")
+
+    def on_start(request):
+        if is_upload(request):
+            tracker["inflight"] += 1
+            tracker["last_change"] = time.time()
+
+    def on_end(request):
+        if is_upload(request):
+            tracker["inflight"] = max(0, tracker["inflight"] - 1)
+            tracker["last_change"] = time.time()
+
+    page.on("request", on_start)
+    page.on("requestfinished", on_end)
+    page.on("requestfailed", on_end)
+    _UPLOAD_TRACKERS[page] = tracker
+
+def uploads_idle(page, timeout_ms, quiet_ms=300):
+    """
+    Waits until no upload request has been in flight for `quiet_ms`.
+    Returns False if tracking isn't installed on this page or it never went quiet.
+    """
+    tracker = _UPLOAD_TRACKERS.get(page)
+    if tracker is None:
+        return False
+    deadline = time.time() + timeout_ms / 1000
+    while time.time() < deadline:
+        quiet_for = (time.time() - tracker["last_change"]) * 1000
+        if tracker["inflight"] == 0 and quiet_for >= quiet_ms:
+            return True
+        page.wait_for_timeout(50)  # Lets Playwright dispatch the network events
+    return False
+
+def section_has_image(container, timeout_ms):
+    """Waits for the uploaded thumbnail <img> to render inside a section container."""
+    if not container:
+        return False
+    container.locator("img").first.wait_for(state="visible", timeout=timeout_ms)
+    return True
+
+def element_detached(page, handle, timeout_ms):
+    """Waits until a clicked element (e.g. a delete button) has been removed from the DOM."""
+    if not handle:
+        return False
+    page.wait_for_function("([el]) => !el.isConnected", arg=[handle], timeout=timeout_ms)
+    return True
+
+def inputs_cleared(page, timeout_ms):
+    """Waits until no 'Delete image' button is left anywhere, i.e. all sections are empty."""
+    page.locator(SELECTORS["delete_image"]).first.wait_for(state="hidden", timeout=timeout_ms)
+    return True
+
+def section_is_empty(container, timeout_ms):
+    """Waits until a section container has no 'Delete image' button left (image removed)."""
+    if not container:
+        return False
+    container.locator(SELECTORS["delete_image"]).first.wait_for(state="hidden", timeout=timeout_ms)
+    return True
+
+_FIND_RUN_BUTTONS_JS = """labels => [...document.querySelectorAll('button')].filter(b =>
+    labels.includes(b.getAttribute('aria-label') || '') ||
+    labels.includes((b.textContent || '').trim()))"""
+RUN_BUTTON_EXISTS_JS = f"labels => ({_FIND_RUN_BUTTONS_JS})(labels).length > 0"
+RUN_BUTTON_ENABLED_JS = f"""labels => ({_FIND_RUN_BUTTONS_JS})(labels).some(b =>
+    !b.disabled && b.getAttribute('aria-disabled') !== 'true' && b.offsetParent !== null)"""
+
+def run_button_enabled(page, timeout_ms):
+    """
+    Waits for the Run button to be enabled.
+    Returns False right away if no known Run button exists (signal unavailable).
+    """
+    if not page.evaluate(RUN_BUTTON_EXISTS_JS, RUN_BUTTON_LABELS):
+        return False
+    page.wait_for_function(RUN_BUTTON_ENABLED_JS, arg=RUN_BUTTON_LABELS, timeout=timeout_ms)
+    return True
+
+def stop_button_gone(page, timeout_ms):
+    """Waits until the Stop/Cancel button (generation in progress) has disappeared."""
+    page.locator(SELECTORS["stop_button"]).first.wait_for(state="hidden", timeout=timeout_ms)
+    return True
+
+def ready_signal_unavailable(phase):
+    """
+    A signal that keeps timing out (missing in this UI, or e.g. background requests keeping the
+    network busy) is skipped — stop paying its timeout. It's re-tried every READY_RETRY_EVERY waits.
+    """
+    with _READY_LOCK:
+        stats = READY_STATS.get(phase)
+        return bool(stats and stats["misses_in_row"] >= READY_GIVE_UP_AFTER
+                    and stats["count"] % READY_RETRY_EVERY != 0)
+
+def ready_timeout_ms(fallback_seconds):
+    """How long a phase waits for its signal: a small multiple of its old fixed sleep, capped."""
+    return min(READY_TIMEOUT_MS, fallback_seconds * READY_TIMEOUT_FACTOR * 1000)
+
+def record_ready(phase, signalled, waited, fallback_seconds):
+    """Adds one readiness wait to READY_STATS."""
+    with _READY_LOCK:
+        stats = READY_STATS.setdefault(phase, {"count": 0, "signalled": 0, "waited": 0.0, "fallback": 0.0,
+                                               "misses_in_row": 0})
+        stats["count"] += 1
+        stats["signalled"] += 1 if signalled else 0
+        stats["misses_in_row"] = 0 if signalled else stats["misses_in_row"] + 1
+        stats["waited"] += waited
+        stats["fallback"] += fallback_seconds
+
+def wait_ready(phase, fallback_seconds, *checks, timeout_ms=None):
+    """
+    Waits for readiness signals instead of a fixed sleep.
+    Each check is called with the remaining timeout (ms) and must return True once ready;
+    returning False or raising (e.g. a timeout) means the signal is unavailable, and we
+    sleep whatever is left of the old `fallback_seconds` pause.
+    Returns True if every signal fired.
+    """
+    timeout_ms = ready_timeout_ms(fallback_seconds) if timeout_ms is None else timeout_ms
+    started = time.time()
+    signalled = True
+
+    if ready_signal_unavailable(phase):
+        checks = ()
+        signalled = False
+
+    for check in checks:
+        remaining = max(0, timeout_ms - (time.time() - started) * 1000)
+        try:
+            if not check(remaining):
+                signalled = False
+        except Exception:
+            signalled = False
+        if not signalled:
+            break
+
+    if not signalled:
+        leftover = fallback_seconds - (time.time() - started)
+        if leftover > 0:
+            time.sleep(leftover)
+
+    record_ready(phase, signalled, time.time() - started, fallback_seconds)
+    return signalled
+
+def print_readiness_report():
+    """Prints per-phase time spent waiting vs. the old fixed sleeps."""
+    if not READY_STATS:
+        return
+    print("\n⏱️ Readiness waits (vs. fixed sleeps):")
+    total_saved = 0.0
+    for phase, stats in READY_STATS.items():
+        saved = stats["fallback"] - stats["waited"]
+        total_saved += saved
+        print(f"    {phase:<14} {stats['count']:>5}x  signal {stats['signalled']}/{stats['count']}  "
+              f"waited {stats['waited']:.1f}s  (fixed {stats['fallback']:.1f}s)  saved {saved:+.1f}s")
+    print(f"    Total saved: {total_saved:.1f}s")
+
+def upload_settled(page, section_name, container):
+    """
+    Waits for an upload to land: thumbnail rendered in the section and upload request finished.
+    Returns True if the thumbnail is there (the page accepted the file).
+    """
+    if not container:
+        _, container = find_section_container(page, section_name)
+    if wait_ready("upload", 1,
+                  lambda t: section_has_image(container, t),
+                  lambda t: uploads_idle(page, t)):
+        return True
+    # The wait gave up (or the network never went quiet) — look for the thumbnail itself
+    try:
+        return bool(container) and container.locator("img").count() > 0
+    except Exception:
+        return False
+
+@timed("delete")
 def delete_existing_image(page, section_name, container):
     """
     Deletes any existing image in a section using the 'Delete image' button.
@@ -102,146 +968,390 @@ def delete_existing_image(page, section_name, container):
     if not container:
         return
     try:
-        delete_btns = container.locator("button[aria-label='Delete image']").all()
+        delete_btns = container.locator(SELECTORS["delete_image"]).all()
         for btn in delete_btns:
             if btn.is_visible(timeout=500):
                 btn.click()
                 print(f"    🗑️ Deleted existing image in '{section_name}'.")
-                time.sleep(1)
+                wait_ready("delete", 1, lambda t: section_is_empty(container, t))
                 return True
     except:
         pass
     return False
 
-def upload_image(page, section_name, file_path, index=0):
-    """
-    Uploads an image to a section (Subject/Scene/Style).
-    Strategy: 
-      1. Find the section container
-      2. Delete any existing image first
-      3. Try direct file input
-      4. Try clicking the empty upload area (draggable div)
-      5. Try clicking "Add new category" button
-    """
-    print(f"  ⬆️ Uploading to '{section_name}'...")
-    try:
-        header, container = find_section_container(page, section_name)
-        
-        if not header:
-            print(f"    ⚠️ Header for '{section_name}' not found.")
-            return False
-        
-        header_box = header.bounding_box()
-        
-        # Step 1: Delete existing image if present
-        if container:
-            delete_existing_image(page, section_name, container)
-            time.sleep(1)
-            # Re-find container after deletion (DOM may have changed)
-            header, container = find_section_container(page, section_name)
-        
-        # Step 2: Try direct file input
-        if container:
-            inputs = container.locator("input[type='file']").all()
-            if inputs:
-                print(f"    👉 Found {len(inputs)} file input(s). Uploading directly...")
-                try:
-                    inputs[0].set_input_files(file_path)
-                    print(f"    ✅ Uploaded to '{section_name}' via file input.")
-                    time.sleep(1)
-                    return True
-                except Exception as e:
-                    print(f"    ⚠️ Direct input failed: {e}")
-        
-        # Step 3: Try clicking the empty draggable upload area
-        if container:
-            # The empty upload area is: div[role='button'][aria-roledescription='draggable'] with no <img> inside
-            draggable = container.locator("div[role='button'][aria-roledescription='draggable']").first
-            try:
-                if draggable.is_visible(timeout=1000):
-                    # Check if it's empty (no image inside)
-                    has_img = draggable.locator("img").count() > 0
-                    if not has_img:
-                        print(f"    👉 Found empty upload area. Clicking...")
-                        try:
-                            with page.expect_file_chooser(timeout=5000) as fc:
-                                draggable.click()
-                            fc.value.set_files(file_path)
-                            print(f"    ✅ Uploaded to '{section_name}' via upload area click.")
-                            time.sleep(1)
-                            return True
-                        except Exception as e:
-                            print(f"    ⚠️ Upload area click failed: {e}")
-            except:
-                pass
-        
-        # Step 4: Try clicking below the header (blind click on upload zone)
-        if header_box:
-            print(f"    👉 Trying click below header...")
-            click_x = header_box['x'] + header_box['width'] / 2
-            click_y = header_box['y'] + 120
-            try:
-                with page.expect_file_chooser(timeout=5000) as fc:
-                    page.mouse.click(click_x, click_y)
-                fc.value.set_files(file_path)
-                print(f"    ✅ Uploaded to '{section_name}' via header-relative click.")
-                time.sleep(1)
-                return True
-            except:
-                pass
-        
-        # Step 5: Try "Add new category" button inside the section
-        if container:
-            try:
-                add_btn = container.locator("button[aria-label='Add new category']").first
-                if add_btn.is_visible(timeout=1000):
-                    print(f"    👉 Clicking 'Add new category' button...")
-                    try:
-                        with page.expect_file_chooser(timeout=5000) as fc:
-                            add_btn.click()
-                        fc.value.set_files(file_path)
-                        print(f"    ✅ Uploaded to '{section_name}' via 'Add new category'.")
-                        time.sleep(1)
-                        return True
-                    except:
-                        pass
-            except:
-                pass
-        
-        # Step 6: Search page-wide for any file inputs near this section
-        print(f"    👉 Last resort: scanning all file inputs on page...")
-        all_inputs = page.locator("input[type='file']").all()
-        if all_inputs:
-            # Pick the one closest in Y to our header
-            best_input = None
-            best_dist = 9999
-            for inp in all_inputs:
-                try:
-                    inp_box = inp.bounding_box()
-                    if inp_box and header_box:
-                        dist = abs(inp_box['y'] - header_box['y'])
-                        if dist < best_dist:
-                            best_dist = dist
-                            best_input = inp
-                except:
-                    pass
-            
-            if best_input:
-                try:
-                    best_input.set_input_files(file_path)
-                    print(f"    ✅ Uploaded to '{section_name}' via nearest file input.")
-                    time.sleep(1)
-                    return True
-                except:
-                    pass
-        
-        print(f"    ❌ Failed to upload to '{section_name}'.")
-        return False
+# ==========================================
+# UPLOAD STRATEGIES
+# ==========================================
+# Each strategy takes (page, section_name, file_path, header_box, container) and returns
+# True once the file was handed to the page, False if it doesn't apply / didn't work.
+# `file_path` is a path or a file already read into memory (read_file_payload()).
 
+def upload_via_file_input(page, section_name, file_path, header_box, container):
+    """Sets the file directly on the section's <input type='file'>."""
+    if not container:
+        return False
+    inputs = container.locator("input[type='file']").all()
+    if not inputs:
+        return False
+    print(f"    👉 Found {len(inputs)} file input(s). Uploading directly...")
+    try:
+        inputs[0].set_input_files(file_path)
+        print(f"    ✅ Uploaded to '{section_name}' via file input.")
+        return True
     except Exception as e:
-        print(f"    ❌ Error uploading to '{section_name}': {e}")
+        print(f"    ⚠️ Direct input failed: {e}")
         return False
 
+def upload_via_draggable(page, section_name, file_path, header_box, container):
+    """Clicks the empty draggable upload area and answers the file chooser."""
+    if not container:
+        return False
+    # The empty upload area is: div[role='button'][aria-roledescription='draggable'] with no <img> inside
+    draggable = container.locator("div[role='button'][aria-roledescription='draggable']").first
+    try:
+        if not draggable.is_visible(timeout=1000):
+            return False
+        # Check if it's empty (no image inside)
+        if draggable.locator("img").count() > 0:
+            return False
+        print(f"    👉 Found empty upload area. Clicking...")
+        try:
+            with page.expect_file_chooser(timeout=5000) as fc:
+                draggable.click()
+            fc.value.set_files(file_path)
+            print(f"    ✅ Uploaded to '{section_name}' via upload area click.")
+            return True
+        except Exception as e:
+            print(f"    ⚠️ Upload area click failed: {e}")
+    except:
+        pass
+    return False
+
+def upload_via_header_click(page, section_name, file_path, header_box, container):
+    """Blind click below the section header, where the upload zone usually is."""
+    if not header_box:
+        return False
+    print(f"    👉 Trying click below header...")
+    click_x = header_box['x'] + header_box['width'] / 2
+    click_y = header_box['y'] + 120
+    try:
+        with page.expect_file_chooser(timeout=5000) as fc:
+            page.mouse.click(click_x, click_y)
+        fc.value.set_files(file_path)
+        print(f"    ✅ Uploaded to '{section_name}' via header-relative click.")
+        return True
+    except:
+        return False
+
+def upload_via_add_category(page, section_name, file_path, header_box, container):
+    """Clicks the "Add new category" button inside the section."""
+    if not container:
+        return False
+    try:
+        add_btn = container.locator("button[aria-label='Add new category']").first
+        if add_btn.is_visible(timeout=1000):
+            print(f"    👉 Clicking 'Add new category' button...")
+            with page.expect_file_chooser(timeout=5000) as fc:
+                add_btn.click()
+            fc.value.set_files(file_path)
+            print(f"    ✅ Uploaded to '{section_name}' via 'Add new category'.")
+            return True
+    except:
+        pass
+    return False
+
+def upload_via_nearest_input(page, section_name, file_path, header_box, container):
+    """Last resort: the page-wide file input closest in Y to the section header."""
+    print(f"    👉 Last resort: scanning all file inputs on page...")
+    all_inputs = page.locator("input[type='file']").all()
+    # Pick the one closest in Y to our header
+    best_input = None
+    best_dist = 9999
+    for inp in all_inputs:
+        try:
+            inp_box = inp.bounding_box()
+            if inp_box and header_box:
+                dist = abs(inp_box['y'] - header_box['y'])
+                if dist < best_dist:
+                    best_dist = dist
+                    best_input = inp
+        except:
+            pass
+    
+    if best_input:
+        try:
+            best_input.set_input_files(file_path)
+            print(f"    ✅ Uploaded to '{section_name}' via nearest file input.")
+            return True
+        except:
+            pass
+    return False
+
+# Builds a File in the page from base64 bytes
+STAGE_FILE_JS = """([name, mime, data]) => {
+    const bin = atob(data);
+    const bytes = new Uint8Array(bin.length);
+    for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+    return new File([bytes], name, {type: mime});
+}"""
+
+# Puts a staged File into an <input type='file'> and lets the app know
+ASSIGN_FILE_JS = """(input, file) => {
+    const dt = new DataTransfer();
+    dt.items.add(file);
+    input.files = dt.files;
+    input.dispatchEvent(new Event('input', {bubbles: true}));
+    input.dispatchEvent(new Event('change', {bubbles: true}));
+}"""
+
+def read_file_payload(file_path):
+    """Reads a file into a Playwright file payload ({name, mimeType, buffer}) for set_input_files()."""
+    with open(file_path, "rb") as f:
+        data = f.read()
+    mime = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    return {"name": os.path.basename(file_path), "mimeType": mime, "buffer": data}
+
+def read_file_for_staging(file_path, payload=None):
+    """Returns [name, mime, base64 data] for STAGE_FILE_JS (from `payload` if already read)."""
+    payload = payload or read_file_payload(file_path)
+    return [payload["name"], payload["mimeType"], base64.b64encode(payload["buffer"]).decode("ascii")]
+
+def stage_file_in_page(page, file_path, payload=None):
+    """
+    Sends a file's bytes to the page once and builds a File object there.
+    `payload` is a read_file_for_staging() result prepared ahead of time (skips the disk read).
+    Returns a JSHandle that upload_via_shared_file() can hand to any number of inputs,
+    or None if staging failed (callers then fall back to normal uploads).
+    """
+    try:
+        return page.evaluate_handle(STAGE_FILE_JS, payload or read_file_for_staging(file_path))
+    except Exception as e:
+        print(f"    ⚠️ Could not stage file in page, uploading per section: {e}")
+        return None
+
+def upload_via_shared_file(page, section_name, file_handle, container):
+    """Assigns an already-staged in-page File to the section's file input via DataTransfer."""
+    if not container:
+        return False
+    file_input = container.locator("input[type='file']").first
+    try:
+        if file_input.count() == 0:
+            return False
+        file_input.evaluate(ASSIGN_FILE_JS, file_handle)
+        print(f"    ✅ Uploaded to '{section_name}' via shared in-page file.")
+        return True
+    except Exception as e:
+        print(f"    ⚠️ Shared file assign failed: {e}")
+        return False
+
+# Default order strategies are tried in (before the cache has learned anything)
+UPLOAD_STRATEGIES = {
+    "file_input": upload_via_file_input,
+    "draggable": upload_via_draggable,
+    "header_click": upload_via_header_click,
+    "add_category": upload_via_add_category,
+    "nearest_input": upload_via_nearest_input,
+}
+
+# ==========================================
+# STRATEGY CACHE
+# ==========================================
+
+# Per-section strategy order + hit/miss counts. The winning strategy moves to the front,
+# a failing one drops back a place. Shared by all workers.
+STRATEGY_CACHE = {"order": {}, "stats": {}}
+_STRATEGY_LOCK = threading.Lock()
+
+def load_strategy_cache():
+    """Loads the learned strategy order from STRATEGY_CACHE_FILE (if enabled and present)."""
+    if not STRATEGY_CACHE_FILE or not os.path.exists(STRATEGY_CACHE_FILE):
+        return
+    try:
+        with open(STRATEGY_CACHE_FILE, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        with _STRATEGY_LOCK:
+            STRATEGY_CACHE["order"] = saved.get("order", {})
+        print(f"🧠 Loaded upload strategy cache from {STRATEGY_CACHE_FILE}")
+    except Exception as e:
+        print(f"⚠️ Could not read strategy cache: {e}")
+
+def save_strategy_cache():
+    """Writes the learned strategy order (and this run's hit/miss counts) to disk."""
+    if not STRATEGY_CACHE_FILE:
+        return
+    try:
+        with _STRATEGY_LOCK:
+            data = json.dumps(STRATEGY_CACHE, indent=2)
+        # Shards share the file: write a private copy and swap it in, so a reader never sees half of it
+        tmp_path = f"{STRATEGY_CACHE_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, STRATEGY_CACHE_FILE)
+    except Exception as e:
+        print(f"⚠️ Could not save strategy cache: {e}")
+
+def _cached_order(section_name):
+    """Cached order for a section (caller holds _STRATEGY_LOCK). Unknown strategies go last."""
+    order = [name for name in STRATEGY_CACHE["order"].get(section_name, []) if name in UPLOAD_STRATEGIES]
+    return order + [name for name in UPLOAD_STRATEGIES if name not in order]
+
+def strategy_order(section_name):
+    """Returns the strategy names to try for a section, best first."""
+    with _STRATEGY_LOCK:
+        return _cached_order(section_name)
+
+def record_strategy_result(section_name, tried, winner):
+    """
+    Updates the cache after an upload: `tried` is the list of strategy names attempted
+    in order, `winner` the one that worked (or None).
+    """
+    with _STRATEGY_LOCK:
+        order = _cached_order(section_name)
+
+        # Demote strategies that failed by one place
+        for name in tried:
+            if name == winner:
+                continue
+            i = order.index(name)
+            if i + 1 < len(order):
+                order[i], order[i + 1] = order[i + 1], order[i]
+        # Promote the winner to the front
+        if winner:
+            order.remove(winner)
+            order.insert(0, winner)
+        STRATEGY_CACHE["order"][section_name] = order
+
+        stats = STRATEGY_CACHE["stats"].setdefault(section_name, {"hits": 0, "misses": 0})
+        if winner and tried and tried[0] == winner:
+            stats["hits"] += 1
+        else:
+            stats["misses"] += 1
+
+def print_strategy_report():
+    """Prints per-section cache hit/miss counts and the learned strategy order."""
+    with _STRATEGY_LOCK:
+        stats = dict(STRATEGY_CACHE["stats"])
+        order = dict(STRATEGY_CACHE["order"])
+    if not stats:
+        return
+    print("\n🧠 Upload strategy cache:")
+    for section, counts in stats.items():
+        best = order.get(section, ["?"])[0]
+        print(f"    {section:<8} hits {counts['hits']}  misses {counts['misses']}  (first choice: {best})")
+
+def upload_image(page, section_name, file_path, index=0, shared_file=None, replace=True, upload_file=None):
+    """
+    Uploads an image to a section (Subject/Scene/Style).
+    Strategy: 
+      1. Find the section container
+      2. Delete any existing image first (skipped with replace=False: the section is known to be empty)
+      3. If the file was already staged in the page (shared_file), assign that to the input
+      4. Try the UPLOAD_STRATEGIES, starting with whichever worked last time
+         for this section (see STRATEGY_CACHE)
+    `upload_file` is the file already read by prepare_job() (read_file_payload()); the
+    strategies hand it over instead of reading `file_path` from disk.
+    """
+    print(f"  ⬆️ Uploading to '{section_name}'...")
+    try:
+        header, container = find_section_container(page, section_name)
+        
+        if not header:
+            print(f"    ⚠️ Header for '{section_name}' not found.")
+            return False
+        
+        # Step 1: Delete existing image if present
+        if container and replace:
+            if delete_existing_image(page, section_name, container):
+                wait_ready("delete_settle", 1, lambda t: uploads_idle(page, t))
+                # Re-find container after deletion (DOM may have changed)
+                header, container = find_section_container(page, section_name)
+        
+        header_box = header.bounding_box() if header else None
+
+        # Step 2: Reuse the File already in the page (no new file transfer)
+        if shared_file:
+            with phase_timer("upload:shared_file", section=section_name) as rec:
+                rec["ok"] = (upload_via_shared_file(page, section_name, shared_file, container)
+                             and upload_settled(page, section_name, container))
+            if rec["ok"]:
+                return True
+            print(f"    ⚠️ '{section_name}' didn't take the shared file, using the upload strategies...")
+
+        # Step 3: Try the strategies, last winner first
+        tried = []
+        for name in strategy_order(section_name):
+            tried.append(name)
+            with phase_timer(f"upload:{name}", section=section_name) as rec:
+                rec["ok"] = UPLOAD_STRATEGIES[name](page, section_name, upload_file or file_path,
+                                                    header_box, container)
+            if rec["ok"]:
+                record_strategy_result(section_name, tried, name)
+                upload_settled(page, section_name, container)
+                return True
+        
+        record_strategy_result(section_name, tried, None)
+        print(f"    ❌ Failed to upload to '{section_name}'.")
+        return False
+
+    except Exception as e:
+        print(f"    ❌ Error uploading to '{section_name}': {e}")
+        return False
+
+# ==========================================
+# DOM SNAPSHOTS
+# ==========================================
+
+# Collects every visible element matching a selector in one evaluate() call.
+# Each element gets a data-whisk-snap id so it can be clicked later without re-querying.
+SNAPSHOT_JS = """
+(selector) => {
+    document.querySelectorAll('[data-whisk-snap]').forEach(el => el.removeAttribute('data-whisk-snap'));
+    const token = Date.now().toString(36);
+    const items = [];
+    document.querySelectorAll(selector).forEach(el => {
+        const r = el.getBoundingClientRect();
+        if (r.width === 0 || r.height === 0) return;
+        const style = getComputedStyle(el);
+        if (style.visibility === 'hidden' || style.display === 'none') return;
+        const id = token + '-' + items.length;
+        el.setAttribute('data-whisk-snap', id);
+        items.push({
+            id: id,
+            label: el.getAttribute('aria-label') || '',
+            text: (el.textContent || '').trim().slice(0, 100),
+            disabled: !!el.disabled || el.getAttribute('aria-disabled') === 'true',
+            box: {x: r.x, y: r.y, width: r.width, height: r.height},
+        });
+    });
+    return {viewport: {width: window.innerWidth, height: window.innerHeight}, items: items};
+}
+"""
+
+def snapshot_elements(page, selector="button"):
+    """
+    Returns {"viewport": {width, height}, "items": [...]} for all visible elements matching
+    `selector`, each item with id, label (aria-label), text, disabled and box.
+    A new snapshot invalidates the ids of the previous one.
+    """
+    return page.evaluate(SNAPSHOT_JS, selector)
+
+def snapshot_locator(page, item):
+    """Stable locator for an element from snapshot_elements()."""
+    return page.locator(f"[data-whisk-snap='{item['id']}']")
+
+def click_snapshot_item(page, item):
+    """Clicks a snapshot element (force click, then JS click as fallback). Returns True on success."""
+    target = snapshot_locator(page, item)
+    try:
+        target.click(force=True, timeout=3000)
+        return True
+    except:
+        try:
+            target.evaluate("el => el.click()")
+            return True
+        except:
+            return False
+
 def login(page):
     """
     Waits for the user to manually log in with their own Google account.
@@ -270,6 +1380,8 @@ def login(page):
     hostname = parsed.hostname or ""
     
     if "accounts.google" in hostname:
+        if HEADLESS:
+            print("    ⚠️ Login needed, but the browser is headless. Run once without --headless to sign in.")
         # Need to log in
         print("    ⏳ Waiting for you to finish logging in...")
         print("    (You only need to do this ONCE — your session will be saved)\n")
@@ -368,24 +1480,14 @@ def login(page):
     if not sidebar_opened:
         # Scan for small icon buttons on the left side
         try:
-            btns = page.locator("button").all()
-            for btn in btns:
-                if not btn.is_visible():
-                    continue
-                box = btn.bounding_box()
-                if not box:
-                    continue
-                # Left side, small, below header
-                if box['x'] < 80 and box['width'] < 60 and box['y'] > 50 and box['y'] < 400:
-                    label = (btn.get_attribute("aria-label") or "").lower()
-                    if "menu" not in label and "navigation" not in label:
-                        print(f"    👉 Trying left-side button at y={box['y']:.0f}...")
-                        btn.click()
-                        page.wait_for_timeout(3000)
-                        if page.locator("text=Subject").first.is_visible(timeout=2000):
-                            sidebar_opened = True
-                            print("    ✅ Sidebar opened!")
-                            break
+            for b in sidebar_toggle_candidates(snapshot_elements(page, "button")):
+                print(f"    👉 Trying left-side button at y={b['box']['y']:.0f}...")
+                snapshot_locator(page, b).click()
+                page.wait_for_timeout(3000)
+                if page.locator("text=Subject").first.is_visible(timeout=2000):
+                    sidebar_opened = True
+                    print("    ✅ Sidebar opened!")
+                    break
         except:
             pass
     
@@ -409,126 +1511,100 @@ def login(page):
     
     print("    ⚠️ Could not verify sections. Proceeding anyway...")
 
+def run_button_candidates(snapshot):
+    """
+    Yields (item, strategy, description) for Run button candidates in a button snapshot,
+    best first. Pure function, shared with the async engine.
+    """
+    buttons = snapshot["items"]
+    vp = snapshot["viewport"]
+
+    # Strategy A: Find the "Whisk it" / "Run" / "Generate" button by aria-label
+    # Use EXACT or near-exact matches to avoid false positives (e.g., "go" matching "category")
+    for label in RUN_BUTTON_LABELS:
+        match = next((b for b in buttons if b['label'] == label), None)
+        if match:
+            yield match, "aria_label", f"aria-label='{label}'"
+
+    # Strategy B: Find button by visible text content (exact match)
+    for text in RUN_BUTTON_TEXTS:
+        match = next((b for b in buttons if b['text'] == text), None)
+        if match:
+            yield match, "button_text", f"text '{text}'"
+
+    # Strategy C: the action button (play/arrow icon) in the bottom area
+    bottom_btns = []
+    for b in buttons:
+        # Must be in the bottom 40% of the page
+        if b['box']['y'] <= vp['height'] * 0.6:
+            continue
+        # Skip known non-action buttons
+        if any(x in b['label'].lower() for x in RUN_SKIP_LABELS):
+            continue
+        if any(x in b['text'].lower() for x in ["stop", "cancel"]):
+            continue
+        bottom_btns.append(b)
+
+    # Pick the right-most button in the bottom area (Run is typically the last action button)
+    if bottom_btns:
+        target = max(bottom_btns, key=lambda b: b['box']['x'])
+        yield target, "bottom_right", f"right-most bottom button at x={target['box']['x']:.0f}, y={target['box']['y']:.0f}"
+
+def sidebar_toggle_candidates(snapshot):
+    """Small icon buttons on the left edge of a button snapshot that may open the sidebar."""
+    candidates = []
+    for b in snapshot["items"]:
+        box = b['box']
+        # Left side, small, below header
+        if box['x'] < 80 and box['width'] < 60 and box['y'] > 50 and box['y'] < 400:
+            label = b['label'].lower()
+            if "menu" not in label and "navigation" not in label:
+                candidates.append(b)
+    return candidates
+
+def wait_previous_generation(page):
+    """Waits (up to 30s) for a generation that is still running to finish before the next Run click."""
+    for i in range(15):
+        stop_btn = page.locator(SELECTORS["stop_button"]).first
+        try:
+            if stop_btn.is_visible(timeout=500):
+                print(f"    ⏳ Previous generation running. Waiting... ({i+1}/15)")
+                time.sleep(2)
+            else:
+                break
+        except:
+            break
+
 def run_generation(page):
     """
     Clicks the Run/Generate/Whisk button using multiple detection strategies.
+    Call wait_previous_generation() first.
     """
     print("  ▶️ Clicking Run button...")
     try:
-        # 1. Wait for any ongoing generation to finish first
-        for i in range(15):
-            stop_btn = page.locator("button[aria-label*='Stop'], button[aria-label*='Cancel']").first
-            try:
-                if stop_btn.is_visible(timeout=500):
-                    print(f"    ⏳ Previous generation running. Waiting... ({i+1}/15)")
-                    time.sleep(2)
-                else:
-                    break
-            except:
-                break
-        
-        # First, dump all button aria-labels for debug (one-time)
+        # One round trip: every visible button with its label, text and position
         print("    🔍 Scanning all visible buttons...")
-        all_buttons = page.locator("button").all()
-        bottom_buttons_debug = []
-        vp = page.viewport_size or {"width": 1280, "height": 720}
-        
-        for btn in all_buttons:
-            try:
-                if not btn.is_visible(timeout=200):
-                    continue
-                box = btn.bounding_box()
-                if not box:
-                    continue
-                label = btn.get_attribute("aria-label") or ""
-                text = (btn.text_content() or "").strip()[:30]
-                # Log buttons in the bottom 50% for debug
-                if box['y'] > vp['height'] * 0.5:
-                    bottom_buttons_debug.append(f"'{label or text}' at ({box['x']:.0f},{box['y']:.0f})")
-            except:
-                continue
+        snapshot = snapshot_elements(page, "button")
+        buttons = snapshot["items"]
+        vp = snapshot["viewport"]
         
+        # Log buttons in the bottom 50% for debug
+        bottom_buttons_debug = [f"'{b['label'] or b['text'][:30]}' at ({b['box']['x']:.0f},{b['box']['y']:.0f})"
+                                for b in buttons if b['box']['y'] > vp['height'] * 0.5]
         if bottom_buttons_debug:
             print(f"    📍 Bottom-area buttons: {', '.join(bottom_buttons_debug)}")
         
-        # Strategy A: Find the "Whisk it" / "Run" / "Generate" button by aria-label
-        # Use EXACT or near-exact matches to avoid false positives (e.g., "go" matching "category")
-        exact_labels = ["Run", "Generate", "Whisk", "Whisk it", "Submit", "Create image"]
-        for label in exact_labels:
-            btn = page.locator(f"button[aria-label='{label}']").first
-            try:
-                if btn.is_visible(timeout=300):
-                    print(f"    👉 Found button: aria-label='{label}'")
-                    btn.click(force=True)
-                    print("    ✅ Clicked Run button.")
-                    return True
-            except:
-                continue
-        
-        # Strategy B: Find button by visible text content (exact role match)
-        text_patterns = ["Whisk it", "Run", "Generate", "Create"]
-        for text in text_patterns:
-            btn = page.get_by_role("button", name=text, exact=True).first
-            try:
-                if btn.is_visible(timeout=300):
-                    print(f"    👉 Found button with text: '{text}'")
-                    btn.click(force=True)
-                    print("    ✅ Clicked Run button.")
-                    return True
-            except:
-                continue
-        
-        # Strategy C: Find button containing a play/arrow SVG icon in the bottom area
-        # The Run button typically has a play_arrow or send icon
-        print("    👉 Looking for action button with arrow/play icon in bottom area...")
-        
-        all_btns = page.locator("button").all()
-        bottom_btns = []
-        
-        skip_labels = ["stop", "cancel", "delete", "download", "aspect", "inspire", 
-                        "add new", "category", "refine", "select", "menu", "close",
-                        "expand", "collapse"]
-        
-        for btn in all_btns:
-            try:
-                if not btn.is_visible(timeout=200):
-                    continue
-                box = btn.bounding_box()
-                if not box:
-                    continue
-                # Must be in the bottom 40% of the page
-                if box['y'] > vp['height'] * 0.6:
-                    label = (btn.get_attribute("aria-label") or "").lower()
-                    text = (btn.text_content() or "").strip().lower()
-                    # Skip known non-action buttons
-                    if any(x in label for x in skip_labels):
-                        continue
-                    if any(x in text for x in ["stop", "cancel"]):
-                        continue
-                    bottom_btns.append((btn, box))
-            except:
-                continue
-        
-        # Pick the right-most button in the bottom area (Run is typically the last action button)
-        if bottom_btns:
-            bottom_btns.sort(key=lambda x: x[1]['x'], reverse=True)
-            target = bottom_btns[0][0]
-            target_box = bottom_btns[0][1]
-            print(f"    👉 Clicking right-most bottom button at x={target_box['x']:.0f}, y={target_box['y']:.0f}")
-            try:
-                target.click(force=True)
-                print("    ✅ Clicked candidate button.")
+        # Strategies A–C against the snapshot, best candidate first
+        for item, strategy, description in run_button_candidates(snapshot):
+            print(f"    👉 Found button: {description}")
+            if click_snapshot_item(page, item):
+                note_phase(strategy=strategy)
+                print("    ✅ Clicked Run button.")
                 return True
-            except:
-                try:
-                    target.evaluate("el => el.click()")
-                    print("    ✅ JS-clicked candidate button.")
-                    return True
-                except:
-                    pass
         
         # Strategy D: Keyboard shortcut
         print("    ⚠️ No Run button found. Trying Enter key as fallback...")
+        note_phase(strategy="enter_key")
         page.keyboard.press("Enter")
         return True
 
@@ -536,202 +1612,1814 @@ def run_generation(page):
         print(f"    ❌ Error during run_generation: {e}")
         return False
 
-def clear_inputs(page):
+def clear_section(page, section):
+    """Removes the image(s) from one section using its 'Delete image' (or remove/clear) button."""
+    try:
+        header, container = find_section_container(page, section)
+        if not container:
+            return
+
+        # Delete all images in this section
+        deleted_any = False
+        for attempt in range(5):  # Handle multiple images per section
+            delete_btn = container.locator(SELECTORS["delete_image"]).first
+            try:
+                if delete_btn.is_visible(timeout=500):
+                    handle = delete_btn.element_handle(timeout=500)
+                    delete_btn.click()
+                    print(f"    ✅ Deleted image from '{section}'.")
+                    deleted_any = True
+                    wait_ready("clear", 0.5, lambda t: element_detached(page, handle, t))
+                else:
+                    break
+            except:
+                break
+
+        if not deleted_any:
+            # Fallback: try other remove/clear button labels
+            btns = container.locator("button, div[role='button']").all()
+            for btn in btns:
+                try:
+                    if not btn.is_visible(timeout=200):
+                        continue
+                    lbl = (btn.get_attribute("aria-label") or "").lower()
+                    if any(word in lbl for word in ["remove", "clear", "delete", "close"]):
+                        handle = btn.element_handle(timeout=500)
+                        btn.click()
+                        print(f"    ✅ Cleared '{section}' via '{lbl}'.")
+                        wait_ready("clear", 0.5, lambda t: element_detached(page, handle, t))
+                        break
+                except:
+                    continue
+
+    except Exception as e:
+        print(f"    ⚠️ Error clearing '{section}': {e}")
+
+def clear_inputs(page, sections=("Subject", "Scene", "Style")):
     """
     Clears uploaded images from Subject, Scene, and Style sections
     using the 'Delete image' button (aria-label from actual UI).
     """
-    print("  🧹 Clearing inputs (Subject, Scene, Style)...")
-    sections = ["Subject", "Scene", "Style"]
-    
+    print(f"  🧹 Clearing inputs ({', '.join(sections)})...")
     for section in sections:
-        try:
-            header, container = find_section_container(page, section)
-            if not container:
-                continue
-            
-            # Delete all images in this section
-            deleted_any = False
-            for attempt in range(5):  # Handle multiple images per section
-                delete_btn = container.locator("button[aria-label='Delete image']").first
-                try:
-                    if delete_btn.is_visible(timeout=500):
-                        delete_btn.click()
-                        print(f"    ✅ Deleted image from '{section}'.")
-                        deleted_any = True
-                        time.sleep(0.5)
-                    else:
-                        break
-                except:
-                    break
-            
-            if not deleted_any:
-                # Fallback: try other remove/clear button labels
-                btns = container.locator("button, div[role='button']").all()
-                for btn in btns:
-                    try:
-                        if not btn.is_visible(timeout=200):
-                            continue
-                        lbl = (btn.get_attribute("aria-label") or "").lower()
-                        if any(word in lbl for word in ["remove", "clear", "delete", "close"]):
-                            btn.click()
-                            print(f"    ✅ Cleared '{section}' via '{lbl}'.")
-                            time.sleep(0.5)
-                            break
-                    except:
-                        continue
+        clear_section(page, section)
 
-        except Exception as e:
-            print(f"    ⚠️ Error clearing '{section}': {e}")
+# ==========================================
+# SECTION STATE
+# ==========================================
+# The bot's own model of what each section holds, so a job does one replace-in-place per
+# section instead of clear_inputs() + the delete in upload_image() + a stabilization wait.
+# Page -> {section: {"file": upload path or None (empty), "pending_delete": bool}}; a section
+# missing from the model is unknown. Before each job the model is compared with a cheap DOM
+# count, and only sections where the two disagree get the full scan-and-clear.
 
-def main():
-    print("🚀 Starting Whisk Automation...")
-    
-    images = load_images([IMAGES_FOLDER_1, IMAGES_FOLDER_2])
-    if not images:
-        print("No images to process. Exiting.")
+SECTION_STATE = {}
+SECTION_STATE_STATS = {"kept": 0, "replaced": 0, "uploaded": 0, "emptied": 0, "rescans": 0}
+_SECTION_STATE_LOCK = threading.Lock()  # Guards both dicts; a page's own model is only touched by its worker
+
+SECTION_IMAGES_JS = f"""([names, selector]) => {{
+    ({RESOLVE_SECTIONS_JS})(names);
+    const counts = {{}};
+    for (const name of names) {{
+        const container = document.querySelector(`[data-whisk-section~='${{name}}']`);
+        counts[name] = container ? container.querySelectorAll(selector).length : null;
+    }}
+    return counts;
+}}"""
+
+def count_section_images(page):
+    """{section: images it shows (None = container not found)} for all sections in one evaluate()."""
+    try:
+        return page.evaluate(SECTION_IMAGES_JS, [list(SELECTORS["sections"]), SELECTORS["delete_image"]])
+    except Exception:
+        return {}
+
+def note_section_state(outcome):
+    with _SECTION_STATE_LOCK:
+        SECTION_STATE_STATS[outcome] += 1
+
+def forget_section_state(page):
+    """Drops a page's model (after a reload or relaunch nothing about the sections is known)."""
+    with _SECTION_STATE_LOCK:
+        SECTION_STATE.pop(page, None)
+
+def reconcile_sections(page, sections):
+    """
+    Checks the model against the DOM before a job. A section that disagrees (or still has a
+    delete pending) is scanned and cleared the old way and is then known to be empty.
+    Returns the page's model, with an entry for every section.
+    """
+    with _SECTION_STATE_LOCK:
+        model = SECTION_STATE.setdefault(page, {})
+    counts = count_section_images(page)
+    for section in sections:
+        state = model.get(section)
+        shown = counts.get(section)
+        if state is None and shown == 0:
+            model[section] = {"file": None, "pending_delete": False}  # Not tracked yet, but visibly empty
+            continue
+        if state and not state["pending_delete"] and shown == (1 if state["file"] else 0):
+            continue
+        print(f"    🔎 '{section}' doesn't look as expected, rescanning it...")
+        note_section_state("rescans")
+        clear_section(page, section)
+        model[section] = {"file": None, "pending_delete": False}
+    return model
+
+def apply_section(page, model, section, upload_path, index=0, shared_file=None, upload_file=None):
+    """
+    Brings one section to `upload_path` (None = empty) in a single visit: keeps it if it already
+    holds that file, otherwise deletes and uploads in place. Returns False if the upload failed.
+    """
+    held = model[section]["file"]
+    if held == upload_path:
+        if upload_path:
+            print(f"    ♻️ '{section}' already has {os.path.basename(upload_path)}, keeping it.")
+            note_section_state("kept")
+        return True
+
+    # Until the old image is confirmed gone, the next reconcile_sections() won't trust this entry
+    model[section] = {"file": held, "pending_delete": held is not None}
+    if upload_path is None:
+        header, container = find_section_container(page, section)
+        if delete_existing_image(page, section, container):
+            model[section] = {"file": None, "pending_delete": False}
+        note_section_state("emptied")
+        return True
+
+    if upload_image(page, section, upload_path, index=index, shared_file=shared_file, replace=held is not None,
+                    upload_file=upload_file):
+        model[section] = {"file": upload_path, "pending_delete": False}
+        note_section_state("replaced" if held else "uploaded")
+        return True
+    model.pop(section, None)  # Unknown now — rescanned before the next job
+    return False
+
+def print_section_state_report():
+    stats = SECTION_STATE_STATS
+    if not any(stats.values()):
         return
+    print(f"\n🧩 Sections: {stats['kept']} kept, {stats['replaced']} replaced in place, "
+          f"{stats['uploaded']} uploaded to empty, {stats['emptied']} emptied, {stats['rescans']} rescanned")
 
-    # Ensure clean slate
-    kill_existing_chrome()
+# ==========================================
+# JOB JOURNAL
+# ==========================================
+# Append-only JSONL: one line per state change ("started" -> "done"/"failed") per image,
+# keyed by path + content hash. The last line for a key wins. An image left at "started"
+# was interrupted by a crash and counts as failed.
 
-    print(f"🔌 Launching Browser (Persistent Profile: {BOT_PROFILE_DIR})...")
-    print("    ℹ️ Your login will be saved — you only need to sign in once!")
-    
-    with sync_playwright() as p:
-        try:
-            # Use persistent context so cookies/login are saved between runs
-            context = p.chromium.launch_persistent_context(
-                user_data_dir=BOT_PROFILE_DIR,
-                headless=False,
-                executable_path=r"C:\Program Files\Google\Chrome\Application\chrome.exe",
-                args=[
-                    "--start-maximized",
-                    "--disable-blink-features=AutomationControlled",
-                    "--disable-gpu"
-                ],
-                ignore_default_args=["--enable-automation"],
-                no_viewport=True,
-                timeout=60000
-            )
-            
-            # Get or create a page
-            page = context.pages[0] if context.pages else context.new_page()
+_JOURNAL_LOCK = threading.Lock()
 
-            print(f"🌐 Navigating to {WHISK_URL}...")
-            try:
-                page.goto(WHISK_URL, timeout=60000)
-            except Exception as nav_err:
-                 print(f"    ⚠️ Navigation warning: {nav_err}")
-            
-            # Perform Login (manual — each user logs in with their own Google account)
-            login(page)
+# How many generations were skipped because the same image content was already done/queued
+DEDUPE_STATS = {"avoided": 0}
 
-            print("\n🏁 Starting Image Processing Loop\n")
-            
-            # Debug: Print current page state before starting
-            print(f"    📍 Current URL: {page.url}")
-            print(f"    📍 Page title: {page.title()}")
-            try:
-                has_subject = page.locator("h4:has-text('Subject')").first.is_visible(timeout=2000)
-                has_scene = page.locator("h4:has-text('Scene')").first.is_visible(timeout=1000)
-                has_style = page.locator("h4:has-text('Style')").first.is_visible(timeout=1000)
-                print(f"    📍 Sections visible — Subject: {has_subject}, Scene: {has_scene}, Style: {has_style}")
-                
-                if not (has_subject or has_scene or has_style):
-                    print("    ⚠️ No sections visible! Waiting 15 seconds for page to load...")
-                    time.sleep(15)
-                    # Try one more time
-                    has_subject = page.locator("h4:has-text('Subject')").first.is_visible(timeout=3000)
-                    print(f"    📍 After wait — Subject visible: {has_subject}")
-                    
-                    if not has_subject:
-                        print("    ⚠️ Still no sections. Dumping page text for debug...")
-                        body_text = page.locator("body").inner_text()[:500]
-                        print(f"    📍 Page text: {body_text}")
-            except Exception as dbg_e:
-                print(f"    ⚠️ Debug check error: {dbg_e}")
-            
-            for idx, (img_path, img_name) in enumerate(images):
-                print(f"[{idx+1}/{len(images)}] Processing: {img_name} (from {os.path.dirname(img_path)})")
-                
-                # 1. Upload to all 3 sections (Sequence: Subject -> Scene -> Style)
-                # Ensure the SELECTORS["sections"] are in this order or sort them.
-                # Current list is ["Scene", "Subject", "Style"] -> Reordering to User Request
-                ordered_sections = ["Subject", "Scene", "Style"]
-                
-                for idx_section, section in enumerate(ordered_sections):
-                    # We pass the index (0, 1, 2) to target the 1st, 2nd, 3rd button
-                    if not upload_image(page, section, img_path, index=idx_section):
-                        # Use a warning but DO NOT BREAK. User wants to force run.
-                        print(f"    ⚠️ Upload to '{section}' failed, but proceeding anyway...")
-                    time.sleep(1) # Brief stability pause
-                
-                # NO 'else' block here. We run this unconditionally.
-                
-                # NEW: Wait 12 seconds as requested by user
-                print("    ⏳ Waiting 12 seconds before generating...")
-                time.sleep(12)
+def file_hash(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file, read in chunks so big images don't have to fit in memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-                # 2. Run Generation (ALWAYS run this)
-                run_generation(page)
-                
-                # 3. Wait for generation to complete before moving on
-                print("    ⏳ Waiting for generation to complete...")
-                generation_started = False
-                for wait_i in range(60):  # Wait up to ~2 minutes
+def load_journal(verbose=True):
+    """
+    Reads JOURNAL_FILE.
+    Returns {"entries": {(path, hash): last entry}, "hashes": {(path, size, mtime_ns): hash},
+             "done_hashes": {hash: path of the first image with that content that was generated}}.
+    """
+    journal = {"entries": {}, "hashes": {}, "done_hashes": {}}
+    if not JOURNAL_FILE or not os.path.exists(JOURNAL_FILE):
+        return journal
+    with open(JOURNAL_FILE, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Torn line from a crash mid-write
+            journal["entries"][(entry["path"], entry["hash"])] = entry
+            journal["hashes"][(entry["path"], entry.get("size"), entry.get("mtime_ns"))] = entry["hash"]
+            if entry["status"] == "done":
+                journal["done_hashes"].setdefault(entry["hash"], entry["path"])
+    if verbose:
+        print(f"📒 Loaded journal: {len(journal['entries'])} image(s) from {JOURNAL_FILE}")
+    return journal
+
+def cached_file_hash(path, journal):
+    """SHA-256 of a file, reused from the journal if size and mtime haven't changed. Returns (hash, stat)."""
+    st = os.stat(path)
+    stat_key = (path, st.st_size, st.st_mtime_ns)
+    content_hash = journal["hashes"].get(stat_key)
+    if not content_hash:
+        content_hash = journal["hashes"][stat_key] = file_hash(path)
+    return content_hash, st
+
+def journal_entry(path, journal, **extra):
+    """
+    Base journal fields for an image. Reuses the journal's hash if size and mtime haven't
+    changed, so a resume doesn't have to re-read thousands of files. New hashes are
+    remembered too, so each file is read at most once per run.
+    For manifest jobs the hash covers the whole Subject/Scene/Style combination.
+    """
+    sections = JOB_SECTIONS.get(path)
+    if sections is None:
+        path = resolve_path(path)
+        content_hash, st = cached_file_hash(path, journal)
+        return dict(path=path, hash=content_hash, size=st.st_size, mtime_ns=st.st_mtime_ns, **extra)
+
+    parts, size, mtime_ns = [], 0, 0
+    for section in sorted(sections):
+        file_path = sections[section]
+        file_hash_value = ""
+        if file_path:
+            file_hash_value, st = cached_file_hash(file_path, journal)
+            size += st.st_size
+            mtime_ns = max(mtime_ns, st.st_mtime_ns)
+        parts.append(f"{section}={file_hash_value}")
+    combined = hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+    return dict(path=path, hash=combined, size=size, mtime_ns=mtime_ns, sections=sections, **extra)
+
+def journal_append(entry):
+    """Appends one entry and fsyncs, so the line survives a crash right after."""
+    if not JOURNAL_FILE:
+        return
+    line = json.dumps(dict(entry, ts=time.strftime("%Y-%m-%d %H:%M:%S")), ensure_ascii=False)
+    with _JOURNAL_LOCK:
+        with open(JOURNAL_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+def filter_with_journal(images, journal, retry_failed=False):
+    """
+    Filters a stream of (img_path, img_name) jobs against the journal.
+    Default: drop images already done. retry_failed=True: keep only failed/interrupted ones.
+    """
+    kept = 0
+    skipped = 0
+    for img_path, img_name in images:
+        try:
+            entry = journal_entry(img_path, journal)
+        except OSError:
+            continue
+        previous = journal["entries"].get((entry["path"], entry["hash"]))
+        status = previous["status"] if previous else None
+        if retry_failed:
+            keep = status in ("failed", "started")
+        else:
+            keep = status not in ("done", "duplicate")
+        if keep:
+            kept += 1
+            yield img_path, img_name
+        else:
+            skipped += 1
+    mode = "retry failed" if retry_failed else "resume"
+    print(f"📒 Journal ({mode}): {kept} image(s) to process, {skipped} skipped.")
+
+def dedupe_images(images, journal):
+    """
+    Skips images whose content (SHA-256) was already seen — either earlier in this run
+    (the same picture in both folders) or generated in a previous run under another name.
+    Skipped copies are journaled as "duplicate" with "duplicate_of" pointing at the original.
+    """
+    first_seen = {}  # hash -> path of the first copy in this run
+    for img_path, img_name in images:
+        try:
+            entry = journal_entry(img_path, journal)
+        except OSError:
+            continue
+        content_hash = entry["hash"]
+        original = first_seen.get(content_hash) or journal["done_hashes"].get(content_hash)
+        if original and original != entry["path"]:
+            print(f"♻️ Skipping duplicate: {img_name} (same image as {original})")
+            journal_append(dict(entry, status="duplicate", duplicate_of=original))
+            with _JOURNAL_LOCK:
+                DEDUPE_STATS["avoided"] += 1
+            continue
+        first_seen.setdefault(content_hash, entry["path"])
+        yield img_path, img_name
+
+def journal_counts():
+    """{status: number of images} from the journal's latest entry per image."""
+    counts = {}
+    for entry in load_journal(verbose=False)["entries"].values():
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    return counts
+
+def print_journal_summary():
+    """Prints how many images in the journal are done / failed."""
+    if not JOURNAL_FILE or not os.path.exists(JOURNAL_FILE):
+        return
+    counts = journal_counts()
+    summary = ", ".join(f"{n} {status}" for status, n in sorted(counts.items()))
+    print(f"📒 Journal: {summary}")
+    if DEDUPE_STATS["avoided"]:
+        print(f"♻️ Duplicates skipped this run: {DEDUPE_STATS['avoided']} generation(s) avoided")
+
+# ==========================================
+# IMAGE NORMALIZATION
+# ==========================================
+
+# Original path -> file that should actually be uploaded (filled by normalize_images())
+UPLOAD_PATHS = {}
+
+def upload_path_for(img_path):
+    """The file to upload for an image: its normalized copy if there is one, else the original."""
+    return UPLOAD_PATHS.get(img_path, img_path)
+
+def normalize_image(src_path, dest_path, max_side, fmt, quality, skip_under_bytes):
+    """
+    Shrinks an image to `max_side` and re-encodes it as `fmt` into `dest_path`.
+    Runs inside a worker process. Returns the path to upload (src_path if it was small enough).
+    """
+    if os.path.exists(dest_path):
+        return dest_path
+
+    with Image.open(src_path) as img:
+        if max(img.size) <= max_side and os.path.getsize(src_path) <= skip_under_bytes:
+            return src_path
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_side, max_side), Image.LANCZOS)  # Only ever shrinks
+        if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        tmp_path = dest_path + ".tmp"
+        img.save(tmp_path, format=fmt, quality=quality, optimize=True)
+    os.replace(tmp_path, dest_path)  # Never leave a half-written file in the cache
+    return dest_path
+
+def normalize_images(images, journal, lookahead=16):
+    """
+    Normalizes images in a process pool ahead of the browser loop, keeping up to `lookahead`
+    images in flight and yielding them in their original order. The upload file for each image
+    is recorded in UPLOAD_PATHS. Falls back to the originals if Pillow isn't installed.
+    """
+    if Image is None:
+        print("⚠️ NORMALIZE_IMAGES is on but Pillow isn't installed (pip install Pillow). Uploading originals.")
+        yield from images
+        return
+
+    os.makedirs(NORMALIZE_CACHE_DIR, exist_ok=True)
+    ext = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}[NORMALIZE_FORMAT]
+    print(f"🖼️ Normalizing inputs to max {NORMALIZE_MAX_SIDE}px {NORMALIZE_FORMAT} (cache: {NORMALIZE_CACHE_DIR})")
+
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=NORMALIZE_PROCESSES) as pool:
+        def drain_one():
+            (img_path, img_name), futures = in_flight.popleft()
+            for file_path, future in futures:
+                try:
+                    UPLOAD_PATHS[file_path] = future.result()
+                except Exception as e:
+                    print(f"⚠️ Could not normalize {os.path.basename(file_path)}, uploading original: {e}")
+            return img_path, img_name
+
+        for img_path, img_name in images:
+            futures = []
+            try:
+                # Manifest jobs can have a different file per section
+                for file_path in job_files(img_path):
+                    content_hash = journal_entry(file_path, journal)["hash"]
+                    # Settings are part of the name, so changing them doesn't reuse stale files
+                    dest_path = os.path.join(NORMALIZE_CACHE_DIR,
+                                             f"{content_hash}_{NORMALIZE_MAX_SIDE}_q{NORMALIZE_QUALITY}.{ext}")
+                    futures.append((file_path, pool.submit(normalize_image, file_path, dest_path, NORMALIZE_MAX_SIDE,
+                                                           NORMALIZE_FORMAT, NORMALIZE_QUALITY,
+                                                           NORMALIZE_SKIP_UNDER_BYTES)))
+            except OSError:
+                continue
+            in_flight.append(((img_path, img_name), futures))
+            if len(in_flight) >= lookahead:
+                yield drain_one()
+        while in_flight:
+            yield drain_one()
+
+def worker_profile_dir(worker_id):
+    """
+    Returns the Chrome profile folder for a worker.
+    Worker 0 uses BOT_PROFILE_DIR; others get their own copy (Chrome can't open one profile twice).
+    """
+    if worker_id == 0:
+        return BOT_PROFILE_DIR
+    return f"{BOT_PROFILE_DIR}_worker{worker_id}"
+
+def prepare_worker_profile(worker_id):
+    """
+    Seeds a worker's profile from the main bot profile so the saved login carries over.
+    Only copies once — an existing worker profile is reused as-is.
+    """
+    profile_dir = worker_profile_dir(worker_id)
+    if worker_id == 0 or os.path.exists(profile_dir) or not os.path.exists(BOT_PROFILE_DIR):
+        return profile_dir
+
+    print(f"📋 Seeding profile for worker {worker_id} from {BOT_PROFILE_DIR}...")
+    try:
+        shutil.copytree(
+            BOT_PROFILE_DIR, profile_dir,
+            # Skip Chrome's lock files and caches (not needed for the login session)
+            ignore=shutil.ignore_patterns("Singleton*", "lockfile", PID_FILE_NAME, "Cache", "Code Cache", "GPUCache"),
+        )
+    except Exception as e:
+        print(f"⚠️ Could not copy profile for worker {worker_id}: {e}")
+    return profile_dir
+
+def browser_launch_options(profile_dir):
+    """Keyword arguments for launch_persistent_context() (shared with the async engine)."""
+    args = [
+        "--disable-blink-features=AutomationControlled",
+        "--disable-gpu"
+    ]
+    if LEAN_BROWSER:
+        args += ["--disable-extensions", "--disable-background-networking",
+                 "--disable-component-update", "--disable-sync", "--mute-audio"]
+    options = dict(
+        user_data_dir=profile_dir,
+        headless=HEADLESS,
+        args=args,
+        ignore_default_args=["--enable-automation"],
+        no_viewport=True,
+        timeout=60000
+    )
+    if CHROME_EXECUTABLE and os.path.exists(CHROME_EXECUTABLE):
+        options["executable_path"] = CHROME_EXECUTABLE
+    if HEADLESS:
+        # No window to maximize — give the page a fixed desktop-sized viewport instead
+        options.update(no_viewport=False, viewport={"width": 1920, "height": 1080})
+    else:
+        args.insert(0, "--start-maximized")
+    return options
+
+def blocked_url_pattern():
+    """One regex for every URL LEAN_BROWSER blocks."""
+    return re.compile("|".join(f"(?:{pattern})" for pattern in BLOCKED_URL_PATTERNS), re.IGNORECASE)
+
+def block_nonessential_requests(context):
+    """
+    With LEAN_BROWSER, aborts analytics, font and media requests in every tab of the context.
+    Only matching URLs are routed, so all other requests never wait on Python.
+    Returns the route registration (a coroutine for async contexts, to be awaited).
+    """
+    if not LEAN_BROWSER:
+        return None
+    print("🪶 Lean browser: blocking analytics, fonts and media.")
+    return context.route(blocked_url_pattern(), lambda route: route.abort())
+
+def launch_browser(p, profile_dir):
+    """
+    Launches Chrome with a persistent profile so cookies/login are saved between runs.
+    """
+    context = p.chromium.launch_persistent_context(**browser_launch_options(profile_dir))
+    record_browser_pid(profile_dir)
+    block_nonessential_requests(context)
+    return context
+
+def browser_responsive(page, timeout_ms=5000):
+    """False if the page/browser has crashed, been closed or stopped answering."""
+    try:
+        page.wait_for_function("() => true", timeout=timeout_ms)
+        return True
+    except Exception:
+        return False
+
+def restart_browser(p, context, profile_dir, tag=""):
+    """Kills a crashed/hung browser, clears its profile locks and opens a fresh Whisk page."""
+    print(f"{tag} 🔁 Restarting browser...")
+    stop_browser(profile_dir)
+    try:
+        context.close()
+    except Exception:
+        pass  # Already gone
+    context = launch_browser(p, profile_dir)
+    return context, open_whisk_page(context)
+
+def browser_processes(profile_dir):
+    """The Chrome browser process launched on `profile_dir` plus all its children (needs psutil)."""
+    marker = "--user-data-dir=" + os.path.abspath(profile_dir)
+    for proc in psutil.process_iter(["cmdline"]):
+        cmdline = proc.info["cmdline"] or []
+        if any(arg.strip('"') == marker for arg in cmdline) and not any(arg.startswith("--type=") for arg in cmdline):
+            try:
+                return [proc] + proc.children(recursive=True)
+            except psutil.Error:
+                return [proc]
+    return []
+
+def process_footprint(profile_dir):
+    """'<RSS> MB RSS in <n> processes, <cpu>s CPU' for the browser on `profile_dir`, or None without psutil."""
+    if psutil is None:
+        return None
+    procs = browser_processes(profile_dir)
+    if not procs:
+        return None
+    rss = cpu = 0.0
+    for proc in procs:
+        try:
+            rss += proc.memory_info().rss
+            cpu += sum(proc.cpu_times()[:2])
+        except psutil.Error:
+            pass
+    return f"{rss / 1_000_000:.0f} MB RSS in {len(procs)} processes, {cpu:.0f}s CPU"
+
+def format_page_metrics(metrics):
+    """Summarizes a DevTools Performance.getMetrics reply."""
+    values = {m["name"]: m["value"] for m in metrics["metrics"]}
+    return (f"JS heap {values.get('JSHeapUsedSize', 0) / 1_000_000:.0f} MB, "
+            f"{values.get('Nodes', 0):.0f} DOM nodes, main thread busy {values.get('TaskDuration', 0):.0f}s")
+
+def report_browser_resources(page, profile_dir, tag=""):
+    """
+    Prints the browser's footprint: total RSS and CPU of its processes (with psutil) and the
+    page's JS heap, DOM size and main-thread busy time (Chrome DevTools Performance metrics).
+    """
+    parts = [process_footprint(profile_dir)]
+    try:
+        cdp = page.context.new_cdp_session(page)
+        cdp.send("Performance.enable")
+        parts.append(format_page_metrics(cdp.send("Performance.getMetrics")))
+        cdp.detach()
+    except Exception:
+        pass
+    parts = [part for part in parts if part]
+    if parts:
+        print(f"{tag} 📈 Browser: {' | '.join(parts)}")
+
+def open_whisk_page(context):
+    """
+    Opens the Whisk project page in the context, waits for login and checks the sections are there.
+    """
+    # Get or create a page
+    page = context.pages[0] if context.pages else context.new_page()
+
+    print(f"🌐 Navigating to {WHISK_URL}...")
+    try:
+        page.goto(WHISK_URL, timeout=60000)
+    except Exception as nav_err:
+         print(f"    ⚠️ Navigation warning: {nav_err}")
+    
+    # Track upload requests so readiness waits can replace fixed sleeps
+    install_readiness_tracking(page)
+    install_result_harvester(page)
+    install_throttle_detection(page)
+
+    # Perform Login (manual — each user logs in with their own Google account)
+    login(page)
+
+    # Debug: Print current page state before starting
+    print(f"    📍 Current URL: {page.url}")
+    print(f"    📍 Page title: {page.title()}")
+    try:
+        has_subject = page.locator("h4:has-text('Subject')").first.is_visible(timeout=2000)
+        has_scene = page.locator("h4:has-text('Scene')").first.is_visible(timeout=1000)
+        has_style = page.locator("h4:has-text('Style')").first.is_visible(timeout=1000)
+        print(f"    📍 Sections visible — Subject: {has_subject}, Scene: {has_scene}, Style: {has_style}")
+        
+        if not (has_subject or has_scene or has_style):
+            print("    ⚠️ No sections visible! Waiting 15 seconds for page to load...")
+            time.sleep(15)
+            # Try one more time
+            has_subject = page.locator("h4:has-text('Subject')").first.is_visible(timeout=3000)
+            print(f"    📍 After wait — Subject visible: {has_subject}")
+            
+            if not has_subject:
+                print("    ⚠️ Still no sections. Dumping page text for debug...")
+                body_text = page.locator("body").inner_text()[:500]
+                print(f"    📍 Page text: {body_text}")
+    except Exception as dbg_e:
+        print(f"    ⚠️ Debug check error: {dbg_e}")
+
+    return page
+
+# ==========================================
+# GENERATION COMPLETION
+# ==========================================
+
+# Tracks the generation state in window.__whiskGen. Mutations are coalesced (one check per
+# 50ms burst), and the check only looks at the Stop button and "Generating" text nodes.
+GENERATION_WATCH_JS = """stopSelector => {
+    const visible = el => el.getClientRects().length > 0;
+    const isRunning = () => {
+        if ([...document.querySelectorAll(stopSelector)].some(visible)) return true;
+        const hits = document.evaluate("//*[text()[contains(., 'Generating')]]", document.body,
+                                       null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (let i = 0; i < hits.snapshotLength; i++) {
+            if (visible(hits.snapshotItem(i))) return true;
+        }
+        return false;
+    };
+    // `previous`: a generation was already running when the watcher was armed — its end
+    // mustn't be taken for the end of the one our Run click starts
+    const state = {running: false, seen: false, done: false, previous: false, startedAt: 0, doneAt: 0};
+    const check = () => {
+        state.scheduled = false;
+        const running = isRunning();
+        if (running && !state.running) {
+            Object.assign(state, {running: true, seen: true, done: false, startedAt: Date.now()});
+        } else if (!running && state.running) {
+            if (state.previous) {
+                Object.assign(state, {running: false, seen: false, previous: false});
+            } else {
+                Object.assign(state, {running: false, done: true, doneAt: Date.now()});
+            }
+        }
+    };
+    if (window.__whiskGenObserver) window.__whiskGenObserver.disconnect();
+    window.__whiskGen = state;
+    window.__whiskGenObserver = new MutationObserver(() => {
+        if (!state.scheduled) {
+            state.scheduled = true;
+            setTimeout(check, 50);
+        }
+    });
+    window.__whiskGenObserver.observe(document.body, {
+        childList: true, subtree: true, characterData: true,
+        attributes: true, attributeFilter: ['style', 'class', 'hidden', 'aria-label'],
+    });
+    check();
+    if (state.running) Object.assign(state, {seen: false, previous: true});
+    return state.running;
+}"""
+GENERATION_STARTED_JS = "() => !!(window.__whiskGen && window.__whiskGen.seen)"
+GENERATION_DONE_JS = "() => !!(window.__whiskGen && window.__whiskGen.done)"
+
+def install_generation_watcher(page):
+    """(Re)arms the in-page generation observer. Returns False if it couldn't be installed."""
+    try:
+        page.evaluate(GENERATION_WATCH_JS, SELECTORS["stop_button"])
+        return True
+    except Exception as e:
+        print(f"    ⚠️ Generation observer unavailable ({e}), polling instead.")
+        return False
+
+def generation_running(page):
+    """One-shot check for the Stop button / 'Generating' indicator (used by the polling fallback)."""
+    for locator in (page.locator(SELECTORS["stop_button"]).first, page.locator("text=Generating").first):
+        try:
+            if locator.is_visible():
+                return True
+        except:
+            pass
+    return False
+
+def poll_generation(page, want_running, timeout_ms):
+    """
+    Fallback: polls until the generation is (or is no longer) running,
+    starting at GENERATION_POLL_MIN_SECONDS and backing off to GENERATION_POLL_MAX_SECONDS.
+    """
+    deadline = time.time() + timeout_ms / 1000
+    interval = GENERATION_POLL_MIN_SECONDS
+    while True:
+        if generation_running(page) == want_running:
+            return True
+        if time.time() >= deadline:
+            return False
+        time.sleep(min(interval, max(0, deadline - time.time())))
+        interval = min(interval * 2, GENERATION_POLL_MAX_SECONDS)
+
+def wait_generation_state(page, watching, script, want_running, timeout_ms):
+    """Waits for the observer flag `script`, or polls if the observer isn't installed."""
+    if watching:
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+        try:
+            page.wait_for_function(script, timeout=timeout_ms, polling=100)
+            return True
+        except PlaywrightTimeoutError:
+            return False
+        except Exception:
+            pass  # Page navigated / observer gone — finish the wait by polling
+    return poll_generation(page, want_running, timeout_ms)
+
+def wait_for_generation(page, on_started=None, watching=None):
+    """
+    Waits for the current generation to finish (Stop button / 'Generating' text gone).
+    `on_started` is called once as soon as the generation is seen running.
+    `watching` is install_generation_watcher()'s result when the observer was armed before the
+    Run click (so a generation that starts and ends quickly isn't missed); None = arm it now.
+    Returns True if a generation was seen, False if none was detected.
+    """
+    print("    ⏳ Waiting for generation to complete...")
+    if watching is None:
+        watching = install_generation_watcher(page)
+
+    if not wait_generation_state(page, watching, GENERATION_STARTED_JS, True, GENERATION_START_TIMEOUT_MS):
+        print("    ⚠️ No generation detected. Moving on...")
+        return False
+
+    print("    🔄 Generation in progress...")
+    if on_started:
+        on_started()
+
+    if wait_generation_state(page, watching, GENERATION_DONE_JS, False, GENERATION_TIMEOUT_MS):
+        print("    ✅ Generation complete!")
+    else:
+        print(f"    ⚠️ Generation still running after {GENERATION_TIMEOUT_MS // 1000}s. Moving on...")
+    return True
+
+# ==========================================
+# RUN PACING
+# ==========================================
+
+# Shared token bucket + AIMD state (all workers/tabs of this process)
+RUN_STATE = {"rate": None, "tokens": 0.0, "updated": 0.0, "paused_until": 0.0,
+             "throttle_streak": 0, "no_generation_streak": 0, "latency_ewma": None}
+RUN_STATS = {"runs": 0, "ok": 0, "throttled": 0, "no_generation": 0, "waited": 0.0, "latencies": []}
+_RUN_LOCK = threading.Lock()
+
+# Per-page count of throttling HTTP responses since the last Run click
+_THROTTLE_TRACKERS = {}
+
+# Text of visible alerts/toasts/dialogs that mention one of THROTTLE_TEXTS, or null
+THROTTLE_MESSAGE_JS = """texts => {
+    const els = document.querySelectorAll(
+        '[role=alert], [role=alertdialog], [role=status], [role=dialog], [aria-live]');
+    for (const el of els) {
+        if (!el.getClientRects().length) continue;
+        const text = (el.innerText || '').trim();
+        if (texts.some(t => text.toLowerCase().includes(t))) return text.slice(0, 200);
+    }
+    return null;
+}"""
+
+def reserve_run_slot():
+    """
+    Takes the next Run slot from the shared bucket and returns how long (seconds) the caller
+    has to wait before clicking. Tokens may go negative: every waiting worker keeps its place in line.
+    """
+    with _RUN_LOCK:
+        now = time.time()
+        if RUN_STATE["rate"] is None:
+            RUN_STATE.update(rate=RUN_RATE_PER_MINUTE, tokens=float(RUN_BURST), updated=now)
+        per_second = RUN_STATE["rate"] / 60
+        RUN_STATE["tokens"] = min(RUN_BURST, RUN_STATE["tokens"] + (now - RUN_STATE["updated"]) * per_second)
+        RUN_STATE["updated"] = now
+        RUN_STATE["tokens"] -= 1
+        wait = max(0.0, -RUN_STATE["tokens"] / per_second, RUN_STATE["paused_until"] - now)
+        RUN_STATS["waited"] += wait
+        rate = RUN_STATE["rate"]
+    if wait >= 0.1:
+        print(f"    🚦 Pacing Run clicks ({rate:.1f}/min): waiting {wait:.1f}s...")
+    return wait
+
+def acquire_run_slot():
+    """Blocks until this worker may click Run. Returns the seconds waited."""
+    if not RUN_PACING:
+        return 0.0
+    wait = reserve_run_slot()
+    if wait > 0:
+        time.sleep(wait)
+    return wait
+
+def record_run_outcome(outcome, latency):
+    """
+    Feeds one generation into the AIMD policy. `outcome` is "ok", "throttled" or
+    "no_generation"; `latency` is how long the generation wait took (seconds).
+    """
+    with _RUN_LOCK:
+        RUN_STATS["runs"] += 1
+        RUN_STATS[outcome] += 1
+        rate = RUN_STATE["rate"] or RUN_RATE_PER_MINUTE
+
+        if outcome != "no_generation":
+            RUN_STATE["no_generation_streak"] = 0
+        if outcome == "ok":
+            RUN_STATS["latencies"].append(latency)
+            RUN_STATE["throttle_streak"] = 0
+            ewma = RUN_STATE["latency_ewma"]
+            if ewma and latency > ewma * RUN_SLOW_FACTOR:
+                rate *= RUN_RATE_DECREASE  # Service is slowing down — ease off before it says no
+            else:
+                rate += RUN_RATE_INCREASE
+            RUN_STATE["latency_ewma"] = latency if ewma is None else 0.8 * ewma + 0.2 * latency
+        elif outcome == "throttled":
+            RUN_STATE["throttle_streak"] += 1
+            rate *= RUN_RATE_DECREASE
+            pause = THROTTLE_PAUSE_SECONDS * min(8, 2 ** (RUN_STATE["throttle_streak"] - 1))
+            RUN_STATE["paused_until"] = max(RUN_STATE["paused_until"], time.time() + pause)
+            print(f"    🚦 Pausing all Run clicks for {pause:.0f}s.")
+        else:
+            # One click that produced nothing is usually the page, not the service; a streak of
+            # them is often a silent throttle
+            RUN_STATE["no_generation_streak"] += 1
+            if RUN_STATE["no_generation_streak"] % max(1, RUN_NO_GENERATION_STREAK) == 0:
+                rate *= RUN_RATE_DECREASE
+
+        RUN_STATE["rate"] = min(RUN_RATE_MAX_PER_MINUTE, max(RUN_RATE_MIN_PER_MINUTE, rate))
+
+def install_throttle_detection(page):
+    """Counts throttling HTTP responses (THROTTLE_STATUS_CODES) on the page."""
+    tracker = {"hits": 0}
+
+    def on_response(response):
+        if response.status in THROTTLE_STATUS_CODES:
+            tracker["hits"] += 1
+
+    page.on("response", on_response)
+    _THROTTLE_TRACKERS[page] = tracker
+
+def begin_throttle_watch(page):
+    tracker = _THROTTLE_TRACKERS.get(page)
+    if tracker:
+        tracker["hits"] = 0
+
+def throttle_reason(page, message):
+    """Describes the throttling seen since begin_throttle_watch() (given the page's alert text), or None."""
+    tracker = _THROTTLE_TRACKERS.get(page)
+    if tracker and tracker["hits"]:
+        return f"HTTP {'/'.join(map(str, THROTTLE_STATUS_CODES))} x{tracker['hits']}"
+    if message:
+        return f'page says "{message}"'
+    return None
+
+def detect_throttling(page):
+    """Checks the network counter and visible alerts for throttling. Returns a reason or None."""
+    try:
+        message = page.evaluate(THROTTLE_MESSAGE_JS, THROTTLE_TEXTS)
+    except Exception:
+        message = None
+    return throttle_reason(page, message)
+
+def run_outcome(generated, throttled):
+    return "throttled" if throttled else "ok" if generated else "no_generation"
+
+def print_pacing_report():
+    """Prints run outcomes, generation latency and where the adaptive rate ended up."""
+    if not RUN_STATS["runs"]:
+        return
+    latencies = sorted(RUN_STATS["latencies"])
+    print(f"\n🚦 Run pacing: {RUN_STATS['runs']} run(s) — {RUN_STATS['ok']} ok, "
+          f"{RUN_STATS['throttled']} throttled, {RUN_STATS['no_generation']} without a generation")
+    print(f"    Generation p50 {percentile(latencies, 0.5):.1f}s / p95 {percentile(latencies, 0.95):.1f}s, "
+          f"paced {RUN_STATS['waited']:.0f}s in total, final rate {RUN_STATE['rate'] or RUN_RATE_PER_MINUTE:.1f}/min")
+
+# ==========================================
+# RESULT HARVESTING
+# ==========================================
+
+# Per-page capture state, filled by install_result_harvester()
+_HARVESTERS = {}
+
+# Files waiting for the writer thread: (path, bytes, manifest_path, manifest_record) or None to stop
+_RESULT_QUEUE = queue.Queue()
+_RESULT_WRITER = None
+_RESULT_LOCK = threading.Lock()
+RESULT_STATS = {"saved": 0, "bytes": 0, "failed": 0}
+
+def is_result_response(response):
+    """True for a successful image download that could be a generated result."""
+    if response.status != 200 or response.url.startswith("data:"):
+        return False
+    if response.request.resource_type not in ("image", "fetch", "xhr"):
+        return False
+    if not response.headers.get("content-type", "").startswith("image/"):
+        return False
+    return not RESULT_URL_PATTERN or re.search(RESULT_URL_PATTERN, response.url) is not None
+
+def install_result_harvester(page):
+    """
+    Remembers image responses while a capture is open (between the Run click and the end
+    of the generation). Only the Response objects are kept here; bodies are read afterwards.
+    """
+    harvester = {"capturing": False, "responses": []}
+
+    def on_response(response):
+        if harvester["capturing"] and is_result_response(response):
+            harvester["responses"].append(response)
+
+    page.on("response", on_response)
+    _HARVESTERS[page] = harvester
+
+def begin_result_capture(page):
+    harvester = _HARVESTERS.get(page)
+    if harvester and RESULTS_DIR:
+        harvester["responses"] = []
+        harvester["capturing"] = True
+
+def end_result_capture(page):
+    """Stops capturing and returns the image responses seen since begin_result_capture()."""
+    harvester = _HARVESTERS.get(page)
+    if not harvester or not harvester["capturing"]:
+        return []
+    harvester["capturing"] = False
+    responses, harvester["responses"] = harvester["responses"], []
+    return responses
+
+def result_output_path(img_name, index, content_type, digest):
+    """
+    RESULTS_DIR/<input stem>/<input stem>_<timestamp>_<n>_<content hash>.<ext>. The hash keeps
+    results apart when inputs share a name (other folder) or an image is redone within a second.
+    """
+    stem = re.sub(r'[<>:"/\\|?*]', "_", os.path.splitext(img_name)[0])
+    ext = mimetypes.guess_extension(content_type.split(";")[0].strip()) or ".png"
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return os.path.join(RESULTS_DIR, stem, f"{stem}_{stamp}_{index + 1}_{digest[:10]}{ext}")
+
+def harvest_results(img_path, img_name, responses):
+    """
+    Reads the captured result bodies (on the page's thread, as Playwright requires) and hands
+    them to the writer thread. Returns the paths the results will be saved to.
+    """
+    bodies = []
+    for response in responses:
+        try:
+            bodies.append((response, response.body()))
+        except Exception as e:
+            print(f"    ⚠️ Couldn't read result {response.url[:80]}: {e}")
+    return save_results(img_path, img_name, bodies)
+
+def save_results(img_path, img_name, bodies):
+    """Queues [(response, body)] for the writer thread, skipping tiny and repeated images."""
+    saved = []
+    seen = set()
+    for response, body in bodies:
+        if len(body) < RESULT_MIN_BYTES:
+            continue
+        digest = hashlib.sha256(body).hexdigest()
+        if digest in seen:
+            continue  # Same image downloaded twice (e.g. preview and full size)
+        seen.add(digest)
+
+        out_path = result_output_path(img_name, len(saved), response.headers.get("content-type", ""), digest)
+        record = {"input": img_path, "output": out_path, "url": response.url, "bytes": len(body),
+                  "sha256": digest, "ts": time.strftime("%Y-%m-%d %H:%M:%S")}
+        if img_path in JOB_SECTIONS:
+            record["sections"] = JOB_SECTIONS[img_path]
+        queue_result_write(out_path, body, os.path.join(RESULTS_DIR, "manifest.jsonl"), record)
+        saved.append(out_path)
+
+    if saved:
+        print(f"    💾 Saving {len(saved)} result(s) to {os.path.dirname(saved[0])}")
+    else:
+        print("    ⚠️ No result image captured.")
+    return saved
+
+def queue_result_write(path, data, manifest_path, record):
+    """Queues a result for the writer thread, starting it on first use."""
+    global _RESULT_WRITER
+    with _RESULT_LOCK:
+        if _RESULT_WRITER is None or not _RESULT_WRITER.is_alive():
+            _RESULT_WRITER = threading.Thread(target=result_writer_loop, name="whisk-results", daemon=True)
+            _RESULT_WRITER.start()
+    _RESULT_QUEUE.put((path, data, manifest_path, record))
+
+def result_writer_loop():
+    """Writer thread: saves each result (via a temp file, so no half-written images) and logs it to the manifest."""
+    while True:
+        item = _RESULT_QUEUE.get()
+        if item is None:
+            break
+        path, data, manifest_path, record = item
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".part", "wb") as f:
+                f.write(data)
+            os.replace(path + ".part", path)
+            with open(manifest_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            RESULT_STATS["saved"] += 1
+            RESULT_STATS["bytes"] += len(data)
+        except OSError as e:
+            print(f"    ⚠️ Couldn't save result {path}: {e}")
+            RESULT_STATS["failed"] += 1
+
+def flush_result_writer():
+    """Waits until every queued result is on disk and stops the writer thread."""
+    global _RESULT_WRITER
+    with _RESULT_LOCK:
+        writer, _RESULT_WRITER = _RESULT_WRITER, None
+    if writer is None:
+        return
+    _RESULT_QUEUE.put(None)
+    writer.join()
+
+def print_results_summary():
+    if RESULT_STATS["saved"] or RESULT_STATS["failed"]:
+        failed = f", {RESULT_STATS['failed']} failed" if RESULT_STATS["failed"] else ""
+        print(f"💾 Results: {RESULT_STATS['saved']} image(s) saved "
+              f"({RESULT_STATS['bytes'] / 1_000_000:.1f} MB) to {RESULTS_DIR}{failed}")
+
+# ==========================================
+# WATCHDOG
+# ==========================================
+
+# Sections that are missing/covered, and whether a known Run button is visible
+PAGE_HEALTH_JS = f"""([sections, labels]) => {{
+    const visible = el => el.getClientRects().length > 0;
+    const headers = [...document.querySelectorAll('h4')].filter(visible);
+    const problems = [];
+    for (const name of sections) {{
+        const header = headers.find(h => (h.textContent || '').toLowerCase().includes(name.toLowerCase()));
+        if (!header) {{
+            problems.push(name + ' section missing');
+            continue;
+        }}
+        // Something on top of a header that's on screen = an overlay/modal is blocking the UI
+        const r = header.getBoundingClientRect();
+        if (r.top >= 0 && r.bottom <= innerHeight && r.left >= 0 && r.right <= innerWidth) {{
+            const top = document.elementFromPoint(r.left + r.width / 2, r.top + r.height / 2);
+            if (top && !header.contains(top) && !top.contains(header)) problems.push(name + ' section covered');
+        }}
+    }}
+    return {{problems: problems, run: ({_FIND_RUN_BUTTONS_JS})(labels).some(visible)}};
+}}"""
+
+# Only require the Run button once the health check has actually seen it (labels can differ per UI)
+WATCHDOG_STATE = {"run_seen": False}
+WATCHDOG_STATS = {"checks": 0, "unhealthy": 0, "recovered": 0, "requeued": 0, "steps": {}}
+_WATCHDOG_LOCK = threading.Lock()  # Workers update the stats from their own threads
+
+def note_watchdog(counter, step=None):
+    """Counts one watchdog event (`step`: also count a recovery step by name)."""
+    with _WATCHDOG_LOCK:
+        if step:
+            WATCHDOG_STATS["steps"][step] = WATCHDOG_STATS["steps"].get(step, 0) + 1
+        if counter:
+            WATCHDOG_STATS[counter] += 1
+
+def page_problems(page):
+    """Returns a list of problems with the page ([] = healthy)."""
+    try:
+        sections = [name for name in ("Subject", "Scene", "Style") if UPLOAD_SECTIONS.get(name, True)]
+        health = page.evaluate(PAGE_HEALTH_JS, [sections, RUN_BUTTON_LABELS])
+    except Exception as e:
+        return [f"page not responding ({str(e).splitlines()[0][:80]})"]
+    problems = health["problems"]
+    if health["run"]:
+        WATCHDOG_STATE["run_seen"] = True
+    elif WATCHDOG_STATE["run_seen"]:
+        problems.append("Run button missing")
+    return problems
+
+def wait_page_healthy(page, timeout_ms):
+    """Re-checks the page every 500ms until it's healthy. Returns the remaining problems."""
+    deadline = time.time() + timeout_ms / 1000
+    while True:
+        problems = page_problems(page)
+        if not problems or time.time() >= deadline:
+            return problems
+        try:
+            page.wait_for_timeout(500)
+        except Exception:
+            time.sleep(0.5)
+
+def reload_whisk_page(page):
+    """Reloads the project page (or goes back to it if the page wandered off)."""
+    if urlparse(page.url).hostname == urlparse(WHISK_URL).hostname:
+        page.reload(timeout=60000)
+    else:
+        page.goto(WHISK_URL, timeout=60000)
+
+def recover_page(p, context, page, profile_dir, tag=""):
+    """
+    Escalates until the page is healthy again: reload, then the sidebar/modal handling from
+    login(), then a full browser relaunch. Returns (context, page, healthy).
+    """
+    forget_section_state(page)  # Whatever the sections held is gone after a reload/relaunch
+    steps = [
+        ("reload", lambda: reload_whisk_page(page)),
+        ("sidebar/modals", lambda: login(page)),
+        ("relaunch", None),
+    ]
+    for name, action in steps:
+        print(f"{tag} 🩺 Recovery step: {name}...")
+        note_watchdog(None, step=name)
+        try:
+            if action is None:
+                context, page = restart_browser(p, context, profile_dir, tag)
+            else:
+                action()
+        except Exception as e:
+            print(f"{tag}     ⚠️ {name} failed: {e}")
+            continue
+        try:
+            # The sidebar may have re-rendered — let the section resolver start over
+            page.evaluate("() => { if (window.__whiskSections) window.__whiskSections.dirty = true; }")
+        except Exception:
+            pass
+        problems = wait_page_healthy(page, WATCHDOG_STEP_TIMEOUT_MS)
+        if not problems:
+            print(f"{tag} ✅ Page healthy again after {name}.")
+            note_watchdog("recovered")
+            return context, page, True
+        print(f"{tag}     ⚠️ Still unhealthy: {', '.join(problems)}")
+    return context, page, False
+
+def watchdog_check(page, tag=""):
+    """Post-iteration health check. Returns the problems found after a short grace period."""
+    note_watchdog("checks")
+    problems = page_problems(page)
+    if problems:
+        # Give transient states (a toast, a re-render) a moment before calling it broken
+        problems = wait_page_healthy(page, 3000)
+    if problems:
+        note_watchdog("unhealthy")
+        print(f"{tag} 🩺 Watchdog: {', '.join(problems)}")
+    return problems
+
+def print_watchdog_report():
+    if not WATCHDOG_STATS["unhealthy"]:
+        return
+    steps = ", ".join(f"{name} x{n}" for name, n in WATCHDOG_STATS["steps"].items())
+    print(f"\n🩺 Watchdog: {WATCHDOG_STATS['unhealthy']} unhealthy of {WATCHDOG_STATS['checks']} checks, "
+          f"{WATCHDOG_STATS['recovered']} recovered ({steps}), {WATCHDOG_STATS['requeued']} image(s) redone")
+
+def process_image(page, img_path, img_name, staged=None, on_generation_started=None):
+    """
+    One full cycle for a single image: replace the section inputs, run, wait, cool down.
+    `staged` is the prepare_job() result if the image was prepared ahead of time;
+    `on_generation_started` is called once the generation is running (pipelining hook).
+    Returns {"status": "done"/"failed", "reason": str, "timings": {phase: seconds}},
+    plus "results" (saved output paths) when done.
+    """
+    begin_image_metrics(img_name)
+    failed_sections = []
+
+    # 1. Upload to all 3 sections (Sequence: Subject -> Scene -> Style)
+    # Ensure the SELECTORS["sections"] are in this order or sort them.
+    # Current list is ["Scene", "Subject", "Style"] -> Reordering to User Request
+    ordered_sections = [s for s in ["Subject", "Scene", "Style"] if UPLOAD_SECTIONS.get(s, True)]
+    files = section_files(img_path)
+    wanted = {section: upload_path_for(files[section]) if files[section] else None for section in ordered_sections}
+
+    with phase_timer("upload"):
+        # Send each distinct file to the page once; sections with the same file share the in-page File
+        payloads = staged.get("payloads", {}) if staged else {}
+        upload_files = staged.get("files", {}) if staged else {}
+        shared_files = {}
+        try:
+            # Inputs aren't cleared after a job: each section is compared with what it holds
+            # and replaced in place only if it changes (see SECTION STATE)
+            with phase_timer("section_state"):
+                model = reconcile_sections(page, ordered_sections)
+            for idx_section, section in enumerate(ordered_sections):
+                upload_path = wanted[section]
+                changes = upload_path and upload_path != model[section]["file"]
+                if changes and SHARED_UPLOAD and upload_path not in shared_files:
+                    shared_files[upload_path] = stage_file_in_page(page, upload_path, payloads.get(upload_path))
+                # We pass the index (0, 1, 2) to target the 1st, 2nd, 3rd button
+                if not apply_section(page, model, section, upload_path, index=idx_section,
+                                     shared_file=shared_files.get(upload_path),
+                                     upload_file=upload_files.get(upload_path)):
+                    # Use a warning but DO NOT BREAK. User wants to force run.
+                    print(f"    ⚠️ Upload to '{section}' failed, but proceeding anyway...")
+                    failed_sections.append(section)
+                if changes:
+                    wait_ready("section_pause", 1, lambda t: uploads_idle(page, t)) # Brief stability pause
+        finally:
+            for shared_file in shared_files.values():
+                if shared_file:
                     try:
-                        # Check if a Stop/Cancel button appears (means generation started)
-                        stop_btn = page.locator("button[aria-label*='Stop'], button[aria-label*='Cancel']").first
-                        if stop_btn.is_visible(timeout=500):
-                            if not generation_started:
-                                print("    🔄 Generation in progress...")
-                                generation_started = True
-                            time.sleep(2)
-                            continue
-                        
-                        # Check for loading/generating indicators
-                        if page.locator("text=Generating").first.is_visible(timeout=300):
-                            if not generation_started:
-                                print("    🔄 Generation in progress...")
-                                generation_started = True
-                            time.sleep(2)
-                            continue
-                        
-                        # If generation had started and stop button is gone, it's done
-                        if generation_started:
-                            print("    ✅ Generation complete!")
-                            time.sleep(2)
-                            break
-                        
-                        # If generation never visibly started, wait a bit and move on
-                        if wait_i > 5:
-                            print("    ⚠️ No generation detected. Moving on...")
-                            break
-                            
+                        shared_file.dispose()
                     except:
                         pass
-                    time.sleep(2)
-                
-                # 4. Cleanup Inputs (ALWAYS run this to clear partial uploads or successful ones)
+    
+    # NO 'else' block here. We run this unconditionally.
+    
+    # Wait until uploads are done and Run is enabled (falls back to the old 12 seconds)
+    with phase_timer("pre_run"):
+        print("    ⏳ Waiting for uploads to finish and Run to be enabled...")
+        wait_ready("pre_run", 12,
+                   lambda t: uploads_idle(page, t),
+                   lambda t: run_button_enabled(page, t))
+
+    # 2. Run Generation (ALWAYS run this) — paced across all workers
+    with phase_timer("run_pacing"):
+        acquire_run_slot()
+    begin_result_capture(page)
+    begin_throttle_watch(page)
+    with phase_timer("run_click"):
+        wait_previous_generation(page)
+        # Armed after the previous generation is over and before the click, so even a very
+        # quick start/stop is recorded
+        watching = install_generation_watcher(page)
+        clicked = run_generation(page)
+    
+    # 3. Wait for generation to complete before moving on
+    generation_started = time.time()
+    with phase_timer("generation_wait") as rec:
+        generated = wait_for_generation(page, on_started=on_generation_started, watching=watching)
+        rec["ok"] = generated
+
+    throttled = detect_throttling(page) if clicked else None
+    if throttled:
+        print(f"    🚦 Throttling detected ({throttled}). Slowing down Run clicks.")
+    if clicked and RUN_PACING:
+        record_run_outcome(run_outcome(generated, throttled), time.time() - generation_started)
+
+    # Hand the generated images to the writer thread before the page moves on
+    responses = end_result_capture(page)
+    results = []
+    if generated and RESULTS_DIR:
+        with phase_timer("harvest"):
+            results = harvest_results(img_path, img_name, responses)
+    
+    # 4. Cleanup: inputs stay in place — the next job replaces only the sections that change
+    with phase_timer("cleanup"):
+        print("-----------------------------------")
+        wait_ready("cooldown", 2, lambda t: stop_button_gone(page, t)) # Cooldown between iterations
+
+    timings = end_image_metrics()
+    if generated:
+        reason = f"upload failed for {', '.join(failed_sections)}" if failed_sections else ""
+        return {"status": "done", "reason": reason, "timings": timings, "results": results}
+    if not clicked:
+        reason = "Run button click failed"
+    elif throttled:
+        reason = f"throttled: {throttled}"
+    elif failed_sections:
+        reason = f"no generation detected (upload failed for {', '.join(failed_sections)})"
+    else:
+        reason = "no generation detected"
+    return {"status": "failed", "reason": reason, "timings": timings}
+
+def prepare_job(job, journal, worker):
+    """
+    Everything about a job that doesn't need the browser: journal entry (content hash) and the
+    bytes of each file to upload, so the upload strategies don't read them from disk (and, with
+    SHARED_UPLOAD, their base64 form for stage_file_in_page()).
+    Returns a dict, or None if the file can't be read anymore.
+    """
+    img_path, img_name = job
+    try:
+        staged = {"img_path": img_path, "img_name": img_name,
+                  "entry": journal_entry(img_path, journal, worker=worker)}
+        upload_paths = {upload_path_for(path) for path in job_files(img_path)}
+        staged["files"] = {path: read_file_payload(path) for path in upload_paths}
+        if SHARED_UPLOAD:
+            staged["payloads"] = {path: read_file_for_staging(path, staged["files"][path]) for path in upload_paths}
+        return staged
+    except OSError as e:
+        print(f"    ⚠️ Skipping {img_name}: {e}")
+        return None
+
+# Fatal worker errors ("[W1] ...") — a run with any of these, or with jobs left over, exits non-zero
+WORKER_ERRORS = []
+
+def record_worker_error(tag, message):
+    with _METRICS_LOCK:
+        WORKER_ERRORS.append(f"{tag} {message}")
+
+def finish_run(progress):
+    """Prints how the run ended. Returns the exit code: 0 only if every job was processed and generated."""
+    with progress["lock"]:
+        unprocessed = progress["total"] - progress["finished"]
+        feeding = progress["feeding"]
+    if WORKER_ERRORS or unprocessed or feeding:
+        print(f"\n❌ Run stopped early: {unprocessed}{'+' if feeding else ''} image(s) not processed "
+              f"(use --resume to continue).")
+        for error in WORKER_ERRORS:
+            print(f"    ⚠️ {error}")
+        return 1
+    print("\n🎉 All images processed!")
+    with _METRICS_LOCK:
+        return 1 if _METRICS["failed"] else 0
+
+# Jobs a stopping worker had already taken from the queue (prepared for pipelining) and hands
+# back. Workers check it before the queue, and before obeying a None sentinel.
+RETURNED_JOBS = deque()
+
+def next_job(job_queue, block=True):
+    """
+    The next (img_path, img_name) job for a worker — a handed-back one first, then the shared
+    queue (None = stop). With block=False raises queue.Empty if nothing is waiting.
+    """
+    try:
+        return RETURNED_JOBS.popleft()
+    except IndexError:
+        pass
+    job = job_queue.get() if block else job_queue.get_nowait()
+    if job is None and RETURNED_JOBS:
+        job_queue.put(None)  # Keep the sentinel for after the handed-back job
+        return next_job(job_queue, block)
+    return job
+
+def finish_job(progress):
+    """Counts a job as finished (processed or skipped) in the shared progress dict."""
+    with progress["lock"]:
+        progress["finished"] += 1
+
+def run_worker(worker_id, job_queue, progress, journal):
+    """
+    Runs one browser/page and keeps pulling (img_path, img_name) jobs from the shared queue
+    until it gets the None sentinel. `progress` is the shared dict from main(),
+    `journal` the state loaded by load_journal() (used to avoid re-hashing known files).
+    """
+    tag = f"[W{worker_id + 1}]"
+    set_metrics_worker(worker_id + 1)
+    profile_dir = prepare_worker_profile(worker_id)
+    processed = 0
+    restarts = 0
+
+    from playwright.sync_api import sync_playwright
+
+    print(f"{tag} 🔌 Launching Browser (Persistent Profile: {profile_dir})...")
+    with sync_playwright() as p:
+        try:
+            context = launch_browser(p, profile_dir)
+            page = open_whisk_page(context)
+
+            print(f"\n{tag} 🏁 Starting Image Processing Loop\n")
+            # Pipelining: while image N generates, the next job is taken from the queue and
+            # prepared (hash + file bytes) on a helper thread, so N+1 starts right away.
+            stager = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"whisk-stage-{worker_id + 1}")
+            next_staged = None  # Future of the prepared next job
+
+            def stage_next():
+                nonlocal next_staged
+                if not PIPELINE_NEXT_IMAGE or next_staged is not None:
+                    return
                 try:
-                    clear_inputs(page)
-                    print("    ⏳ Stabilizing UI after cleanup (5s)...")
-                    time.sleep(5)
-                except: pass
-                
-                print("-----------------------------------")
-                time.sleep(2) # Cooldown between iterations
-                
-            print("\n🎉 All images processed!")
+                    job = next_job(job_queue, block=False)
+                except queue.Empty:
+                    return  # Nothing waiting yet — we'll block on the queue after this image
+                if job is None:
+                    job_queue.put(None)  # Keep the sentinel for the main loop
+                    return
+                print(f"    🧺 Preparing next image while this one generates: {job[1]}")
+                next_staged = stager.submit(prepare_job, job, journal, worker_id + 1)
+
+            try:
+                while True:
+                    if next_staged is not None:
+                        staged, next_staged = next_staged.result(), None
+                    else:
+                        job = next_job(job_queue)
+                        if job is None:
+                            break  # Feeder is done
+                        staged = prepare_job(job, journal, worker_id + 1)
+                    if staged is None:
+                        finish_job(progress)
+                        continue  # File vanished before we got to it
+                    img_path, img_name, entry = staged["img_path"], staged["img_name"], staged["entry"]
+
+                    with progress["lock"]:
+                        progress["done"] += 1
+                        position = progress["done"]
+                        total = f"{progress['total']}{'+' if progress['feeding'] else ''}"
+                    print(f"{tag} [{position}/{total}] Processing: {img_name} (from {os.path.dirname(img_path)})")
+                    journal_append(dict(entry, status="started"))
+                    redone = unrecoverable = False
+                    while True:
+                        error = None
+                        try:
+                            result = process_image(page, img_path, img_name, staged=staged,
+                                                   on_generation_started=stage_next)
+                        except Exception as e:
+                            error = e
+
+                        # process_image() handles most errors itself, so a dead or hung browser usually
+                        # shows up as a failed result rather than an exception — check after every failure
+                        failed = error is not None or result["status"] != "done" or result["reason"]
+                        if failed and not browser_responsive(page):
+                            problem = error or result["reason"]
+                            if restarts < MAX_BROWSER_RESTARTS:
+                                print(f"{tag} 💥 Browser crashed or stopped responding ({problem}).")
+                                restarts += 1
+                                context, page = restart_browser(p, context, profile_dir, tag)
+                                print(f"{tag} 🔁 Retrying {img_name} ({restarts}/{MAX_BROWSER_RESTARTS} restarts used)")
+                                continue
+                            print(f"{tag} 💥 Browser is gone and {MAX_BROWSER_RESTARTS} restarts are used up.")
+                            unrecoverable = True
+                        if error is not None:
+                            journal_append(dict(entry, status="failed", reason=f"error: {error}"))
+                            record_job_outcome({"status": "failed"})
+                            raise error
+                        if unrecoverable:
+                            break
+
+                        # Watchdog: make sure the page is usable before the next image
+                        if not WATCHDOG or not watchdog_check(page, tag):
+                            break
+                        context, page, healthy = recover_page(p, context, page, profile_dir, tag)
+                        affected = result["status"] != "done" or result["reason"]
+                        if healthy and affected and not redone:
+                            print(f"{tag} 🔁 Redoing {img_name} (it ran on a broken page: {result['reason']})")
+                            note_watchdog("requeued")
+                            redone = True
+                            continue
+                        unrecoverable = not healthy
+                        break
+                    journal_append(dict(entry, **result))
+                    record_job_outcome(result)
+                    finish_job(progress)
+                    processed += 1
+                    if unrecoverable:
+                        print(f"{tag} ❌ Page could not be recovered. Stopping this worker (use --resume to continue).")
+                        record_worker_error(tag, "page could not be recovered")
+                        break
+                    if RESOURCE_REPORT_EVERY and processed % RESOURCE_REPORT_EVERY == 0:
+                        report_browser_resources(page, profile_dir, tag)
+            finally:
+                if next_staged is not None:
+                    # Give a prepared-but-unstarted job back to the other workers
+                    leftover = next_staged.result()
+                    if leftover:
+                        RETURNED_JOBS.append((leftover["img_path"], leftover["img_name"]))
+                stager.shutdown(wait=False)
+
+            print(f"{tag} ✅ Worker finished — {processed} image(s) processed.")
+            report_browser_resources(page, profile_dir, tag)
             time.sleep(5) # Let user see final result
-            
             context.close()
-            
+
         except Exception as e:
-            print(f"\n❌ Critical Error: {e}")
+            print(f"\n{tag} ❌ Critical Error: {e}")
             print("Tip: Ensure all Chrome instances are closed before running this script.")
+            record_worker_error(tag, f"critical error: {e}")
 
-if __name__ == "__main__":
-    main()
+def feed_jobs(jobs, job_queue, progress, worker_count):
+    """
+    Moves jobs from a (possibly endless) image stream into the shared queue, then puts one
+    None sentinel per worker so they all stop once the stream is exhausted.
+    """
+    try:
+        for job in jobs:
+            with progress["lock"]:
+                progress["total"] += 1
+            job_queue.put(job)
+    finally:
+        with progress["lock"]:
+            progress["feeding"] = False
+        for _ in range(worker_count):
+            job_queue.put(None)
+
+# ==========================================
+# SHARDING
+# ==========================================
+
+def shard_profile_dir(index):
+    """Chrome profile for shard `index` (0-based)."""
+    if index < len(SHARD_PROFILE_DIRS):
+        return SHARD_PROFILE_DIRS[index]
+    if index == 0:
+        return BOT_PROFILE_DIR
+    return f"{BOT_PROFILE_DIR}_shard{index + 1}"
+
+def shard_of(path, count):
+    """Stable shard index for an image path (same answer in every process and run)."""
+    key = os.path.normcase(os.path.abspath(path)).encode("utf-8", "surrogateescape")
+    return int(hashlib.sha1(key).hexdigest()[:8], 16) % count
 
+def shard_images(images, index, count):
+    """Keeps only the (img_path, img_name) jobs that belong to shard `index` of `count`."""
+    for img_path, img_name in images:
+        if shard_of(img_path, count) == index:
+            yield img_path, img_name
+
+def parse_shard(value):
+    """'2/4' -> (1, 4): shard numbers are 1-based on the command line."""
+    try:
+        number, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected N/K, got {value!r}")
+    if not 1 <= number <= count:
+        raise argparse.ArgumentTypeError(f"shard number must be between 1 and {count}")
+    return number - 1, count
+
+def shard_command(script, index, count, argv):
+    """Command line for one shard process: the same script and flags, plus --shard/--profile-dir."""
+    passthrough = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg == "--shards":
+            skip = True  # Drop the value too
+        elif not arg.startswith("--shards="):
+            passthrough.append(arg)
+    return [sys.executable, script, *passthrough,
+            "--shard", f"{index + 1}/{count}", "--profile-dir", shard_profile_dir(index)]
+
+def stream_shard_output(proc, tag):
+    for line in proc.stdout:
+        print(f"{tag} {line}", end="", flush=True)
+
+def run_shards(count, argv, script=None):
+    """
+    Starts `count` shard processes of `script` (default: this file), prefixes their output
+    with [S<n>] and waits for all of them. Returns the number of shards that failed.
+    """
+    script = os.path.abspath(script or __file__)
+    env = dict(os.environ, PYTHONIOENCODING="utf-8", PYTHONUNBUFFERED="1")
+    print(f"🧩 Starting {count} shards...")
+    procs = []
+    for index in range(count):
+        cmd = shard_command(script, index, count, argv)
+        print(f"[S{index + 1}] 🗂️ Profile: {shard_profile_dir(index)}")
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env,
+                                text=True, encoding="utf-8", errors="replace")
+        threading.Thread(target=stream_shard_output, args=(proc, f"[S{index + 1}]"),
+                         name=f"whisk-shard-{index + 1}", daemon=True).start()
+        procs.append(proc)
+
+    try:
+        codes = [proc.wait() for proc in procs]
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping shards...")
+        for proc in procs:
+            proc.terminate()
+        raise
+
+    failed = [index + 1 for index, code in enumerate(codes) if code]
+    if failed:
+        print(f"⚠️ Shard(s) {', '.join(map(str, failed))} exited with an error.")
+    else:
+        print(f"🎉 All {count} shards finished.")
+    return len(failed)
+
+def apply_shard_args(args):
+    """In a shard process: use the shard's profile folder."""
+    global BOT_PROFILE_DIR
+    if args.profile_dir:
+        BOT_PROFILE_DIR = os.path.abspath(args.profile_dir)
+
+def apply_browser_args(args):
+    """--headless / --lean override HEADLESS / LEAN_BROWSER."""
+    global HEADLESS, LEAN_BROWSER
+    if args.headless:
+        HEADLESS = True
+    if args.lean:
+        LEAN_BROWSER = True
+
+# ==========================================
+# SETTINGS
+# ==========================================
+
+# Types of the settings whose default is None (the rest follow their default's type)
+SETTING_TYPES = {"NORMALIZE_PROCESSES": int, "RESULT_URL_PATTERN": str}
+
+def setting_type(name, default):
+    return SETTING_TYPES.get(name) if default is None else type(default)
+
+def setting_allows_none(default):
+    """Paths/patterns (str or None defaults) can be switched off with None; numbers and flags can't."""
+    return default is None or isinstance(default, str)
+
+def coerce_setting(name, value, default):
+    """
+    Checks a config-file value against the setting's type: "none"/null = None, strings for
+    non-string settings are parsed like WHISK_<NAME> values ("false", "2"), JSON lists become
+    tuples where the default is one (e.g. SUPPORTED_EXTENSIONS). Raises ValueError otherwise.
+    """
+    kind = setting_type(name, default)
+    if value is None or (isinstance(value, str) and value.strip().lower() in ("none", "null")):
+        if not setting_allows_none(default):
+            raise ValueError("can't be None")
+        return None
+    if kind is None:
+        return value
+    if kind is str:
+        if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+            return str(value)
+    elif isinstance(value, str):
+        return parse_setting(name, value, default)
+    elif kind is bool:
+        if isinstance(value, bool):
+            return value
+    elif kind is int:
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+    elif kind is float:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    elif kind in (tuple, list):
+        if isinstance(value, (list, tuple)):
+            return kind(value)
+    elif isinstance(value, kind):
+        return value
+    raise ValueError(f"expected {kind.__name__}, got {value!r}")
+
+def parse_setting(name, raw, default):
+    """Converts a WHISK_<NAME> environment string to the setting's type ("none"/"null" = None)."""
+    text = raw.strip()
+    kind = setting_type(name, default)
+    if text.lower() in ("none", "null"):
+        return coerce_setting(name, None, default)
+    if kind is str:
+        return raw
+    if kind is bool:
+        if text.lower() in ("1", "true", "yes", "on"):
+            return True
+        if text.lower() in ("0", "false", "no", "off"):
+            return False
+        raise ValueError(f"expected true/false, got {raw!r}")
+    if kind in (int, float):
+        return kind(text)
+    value = json.loads(text)  # Lists/dicts/tuples as JSON
+    if isinstance(value, str):
+        raise ValueError(f"expected {kind.__name__}, got {raw!r}")
+    return coerce_setting(name, value, default)
+
+def load_settings(config_path=None, environ=None):
+    """
+    Reads the config file ($WHISK_CONFIG or CONFIG_FILE if not given, if it exists) and
+    WHISK_<NAME> environment variables. Returns {name: value}, the environment winning over
+    the file. Unknown names and bad values are reported and skipped.
+    """
+    environ = os.environ if environ is None else environ
+    path = config_path or environ.get(f"{ENV_PREFIX}CONFIG")
+    if not path and os.path.exists(CONFIG_FILE):
+        path = CONFIG_FILE
+
+    settings = {}
+    if path:
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            sys.exit(f"❌ Can't read config file {path}: {e}")
+        if not isinstance(data, dict):
+            sys.exit(f"❌ Config file {path} must contain a JSON object")
+        for key, value in data.items():
+            name = key.upper()
+            if name not in SETTING_NAMES:
+                print(f"    ⚠️ Unknown setting in {path}: {key}")
+                continue
+            try:
+                settings[name] = coerce_setting(name, value, globals()[name])
+            except ValueError as e:
+                print(f"    ⚠️ Ignoring {key} in {path}: {e}")
+
+    for name in SETTING_NAMES:
+        raw = environ.get(ENV_PREFIX + name)
+        if raw is None:
+            continue
+        try:
+            settings[name] = parse_setting(name, raw, globals()[name])
+        except ValueError as e:
+            print(f"    ⚠️ Ignoring {ENV_PREFIX}{name}: {e}")
+    return settings
+
+def apply_config(config_path=None, verbose=True):
+    """Loads the config file / environment settings over the defaults (flags are applied after)."""
+    settings = load_settings(config_path)
+    globals().update(settings)
+    if settings and verbose:
+        print(f"⚙️ Settings from config/environment: {', '.join(sorted(settings))}")
+    return settings
+
+def apply_run_args(args):
+    """--workers / --chrome override WORKER_COUNT / CHROME_EXECUTABLE."""
+    global WORKER_COUNT, CHROME_EXECUTABLE
+    if args.workers:
+        WORKER_COUNT = args.workers
+    if args.chrome:
+        CHROME_EXECUTABLE = args.chrome
+
+def image_folders(args):
+    """The folders to take images from: --folder if given, else IMAGES_FOLDER_1/2."""
+    return args.folder or [IMAGES_FOLDER_1, IMAGES_FOLDER_2]
+
+def build_arg_parser(description="Whisk Automation Bot"):
+    parser = argparse.ArgumentParser(description=description)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--resume", action="store_true",
+                      help="skip images the journal already marks as done")
+    mode.add_argument("--retry-failed", action="store_true",
+                      help="only process images that failed (or were interrupted) last time")
+    parser.add_argument("--allow-duplicates", action="store_true",
+                        help="process every file even if the same image content was already seen")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--watch", action="store_true",
+                        help="keep running and process new images as they are dropped into the folders")
+    source.add_argument("--manifest", default=None, metavar="FILE",
+                        help="CSV/JSONL/JSON listing the Subject/Scene/Style image for each job, instead of the folders")
+    parser.add_argument("--shards", type=int, default=None,
+                        help="run this many independent bot processes, each with its own profile (default SHARD_COUNT)")
+    parser.add_argument("--shard", type=parse_shard, default=None, metavar="N/K",
+                        help="only process this shard's share of the images (set by --shards)")
+    parser.add_argument("--profile-dir", default=None,
+                        help="Chrome profile folder to use instead of BOT_PROFILE_DIR")
+    parser.add_argument("--headless", action="store_true", default=None,
+                        help="run Chrome without a window (sign in once with a window first)")
+    parser.add_argument("--lean", action="store_true", default=None,
+                        help="block analytics, fonts and media the bot doesn't need")
+    parser.add_argument("--config", default=None, metavar="FILE",
+                        help="JSON settings file (default: $WHISK_CONFIG or whisk_config.json next to the script)")
+    parser.add_argument("--folder", action="append", default=None, metavar="DIR",
+                        help="image folder to process instead of IMAGES_FOLDER_1/2 (repeatable)")
+    parser.add_argument("--workers", type=int, default=None, help="Whisk pages in parallel (WORKER_COUNT)")
+    parser.add_argument("--chrome", default=None, metavar="PATH", help="Chrome executable (CHROME_EXECUTABLE)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only list the jobs that would be processed (no browser is started)")
+    return parser
+
+def parse_args(argv=None):
+    return build_arg_parser().parse_args(argv)
+
+def filter_images(images, args, journal, streaming=False):
+    """
+    Applies sharding, journal filtering (--resume / --retry-failed), dedupe and normalization
+    to an (img_path, img_name) stream. `streaming` sources (watch mode, the daemon) can block
+    between images, so normalization doesn't read ahead of them.
+    """
+    if args.shard:
+        images = shard_images(images, *args.shard)
+    if args.resume or args.retry_failed:
+        images = filter_with_journal(images, journal, retry_failed=args.retry_failed)
+    if DEDUPE_IMAGES and not args.allow_duplicates:
+        images = dedupe_images(images, journal)
+    if NORMALIZE_IMAGES:
+        images = normalize_images(images, journal, lookahead=1 if streaming else 16)
+    return images
+
+def build_image_source(args, journal):
+    """
+    Builds the lazy (img_path, img_name) stream for a run: discovery (watch, manifest), journal
+    filtering, dedupe and normalization. Returns None if there is nothing to process.
+    """
+    # Images are discovered lazily, so the browser starts while big folders are still being listed
+    folders = image_folders(args)
+    if args.manifest:
+        images = iter_manifest(args.manifest)
+    else:
+        images = watch_images(folders) if args.watch else iter_images(folders)
+    images = filter_images(images, args, journal, streaming=args.watch)
+
+    first = next(images, None)
+    if first is None:
+        return None
+    return itertools.chain([first], images)
+
+def list_jobs(args):
+    """--dry-run: prints the jobs a run would process (journal filters and dedupe applied). Returns 0."""
+    global JOURNAL_FILE, NORMALIZE_IMAGES
+    journal = load_journal()
+    JOURNAL_FILE = None       # Nothing is recorded (e.g. skipped duplicates)
+    NORMALIZE_IMAGES = False  # No need to prepare uploads
+    args.watch = False        # List what's there now instead of waiting for more
+    count = 0
+    for img_path, img_name in build_image_source(args, journal) or []:
+        count += 1
+        print(f"  {img_name}  ({img_path})")
+    print(f"📋 {count} job(s) would be processed.")
+    return 0
+
+def print_run_reports():
+    """End-of-run output: readiness, strategy cache, journal and timing summaries."""
+    print_readiness_report()
+    print_strategy_report()
+    save_strategy_cache()
+    print_journal_summary()
+    print_section_state_report()
+    print_results_summary()
+    print_pacing_report()
+    print_watchdog_report()
+    print_metrics_summary()
+
+def main(argv=None):
+    """Runs the bot. Returns the exit code: 0 if every image was generated, 1 otherwise."""
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+    apply_config(args.config)
+    shards = args.shards or SHARD_COUNT
+    if shards > 1 and not args.shard and not args.dry_run:
+        return 1 if run_shards(shards, argv) else 0
+    apply_shard_args(args)
+    apply_browser_args(args)
+    apply_run_args(args)
+    if args.dry_run:
+        return list_jobs(args)
+    print("🚀 Starting Whisk Automation...")
+    
+    journal = load_journal()
+    images = build_image_source(args, journal)
+    if images is None:
+        print("No images to process. Exiting.")
+        return 0
+
+    # Shared work queue — a feeder thread streams images in, every worker pulls the next one
+    worker_count = max(1, WORKER_COUNT)
+
+    # Ensure clean slate (only our own profiles — other shards keep running)
+    stop_owned_browsers([worker_profile_dir(worker_id) for worker_id in range(worker_count)])
+    load_strategy_cache()
+
+    job_queue = queue.Queue()
+    progress = {"done": 0, "finished": 0, "total": 0, "feeding": True, "lock": threading.Lock()}
+    threading.Thread(target=feed_jobs, args=(images, job_queue, progress, worker_count),
+                     name="whisk-feeder", daemon=True).start()
+
+    print("    ℹ️ Your login will be saved — you only need to sign in once!")
+
+    if worker_count == 1:
+        # Classic mode: a single page in the main thread
+        run_worker(0, job_queue, progress, journal)
+    else:
+        print(f"👷 Starting {worker_count} workers...")
+        # Playwright's sync API is per-thread, so each worker gets its own thread + browser
+        workers = []
+        for worker_id in range(worker_count):
+            # Profiles are seeded here (not in the threads) so copies don't race each other
+            prepare_worker_profile(worker_id)
+            t = threading.Thread(target=run_worker, args=(worker_id, job_queue, progress, journal),
+                                 name=f"whisk-worker-{worker_id + 1}", daemon=True)
+            t.start()
+            workers.append(t)
+        for t in workers:
+            t.join()
+
+    exit_code = finish_run(progress)
+    flush_result_writer()
+    print_run_reports()
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
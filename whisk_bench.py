@@ -0,0 +1,158 @@
+import os
+import time
+import zlib
+import struct
+import argparse
+import tempfile
+import threading
+import functools
+import http.server
+
+import whisk_automation as wa
+
+# ==========================================
+# OFFLINE BENCHMARK
+# ==========================================
+# Drives the real upload/run/clear functions from whisk_automation.py against
+# mock_whisk.html (served locally), so performance changes can be measured
+# without touching the live Google service.
+
+MOCK_DIR = os.path.dirname(os.path.abspath(__file__))
+MOCK_PAGE = "mock_whisk.html"
+
+class MockWhiskHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves the mock page and fakes the upload / generate endpoints."""
+    upload_delay = 0.2  # seconds per POST /upload
+    result_png = b""
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+        if self.path.startswith("/upload"):
+            time.sleep(self.upload_delay)
+            body, content_type = b'{"ok": true}', "application/json"
+        elif self.path.startswith("/generate"):
+            body, content_type = self.result_png, "image/png"
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output readable
+
+def make_png(path, size, seed):
+    """Writes a simple gradient PNG (no Pillow needed). `seed` makes every image different."""
+    rows = []
+    for y in range(size):
+        row = bytearray([0])  # Filter type 0 for each scanline
+        for x in range(size):
+            row += bytes(((x + seed * 37) % 256, (y + seed * 91) % 256, (x + y + seed) % 256))
+        rows.append(bytes(row))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    png = (b"\x89PNG\r\n\x1a\n"
+           + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+           + chunk(b"IDAT", zlib.compress(b"".join(rows), 6))
+           + chunk(b"IEND", b""))
+    with open(path, "wb") as f:
+        f.write(png)
+
+def make_images(folder, count, size):
+    """Creates `count` synthetic images. Returns [(path, name)]."""
+    images = []
+    for i in range(count):
+        name = f"bench_{i:04d}.png"
+        path = os.path.join(folder, name)
+        make_png(path, size, seed=i)
+        images.append((path, name))
+    return images
+
+def start_mock_server(upload_delay):
+    """Starts the mock server on a free localhost port. Returns (server, base_url)."""
+    handler = functools.partial(MockWhiskHandler, directory=MOCK_DIR)
+    MockWhiskHandler.upload_delay = upload_delay
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, name="mock-whisk", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def run_benchmark(count=10, gen_delay_ms=3000, upload_delay_ms=200, size=512, headed=False):
+    """Processes `count` synthetic images on the mock page and prints per-phase latency and throughput."""
+    from playwright.sync_api import sync_playwright
+
+    # Keep the benchmark from touching the real run's cache/journal/metrics files
+    wa.STRATEGY_CACHE_FILE = None
+    wa.JOURNAL_FILE = None
+    # The mock never throttles; pacing would only cap the measured throughput
+    wa.RUN_PACING = False
+
+    with tempfile.TemporaryDirectory(prefix="whisk_bench_") as folder:
+        # Results are harvested for real (it's part of the per-image cost), into the temp folder
+        wa.RESULTS_DIR = os.path.join(folder, "results")
+        print(f"🧪 Creating {count} synthetic {size}x{size} images...")
+        images = make_images(folder, count, size)
+        with open(images[0][0], "rb") as f:
+            MockWhiskHandler.result_png = f.read()
+
+        server, base_url = start_mock_server(upload_delay_ms / 1000)
+        url = f"{base_url}/{MOCK_PAGE}?delay={gen_delay_ms}"
+        print(f"🌐 Mock Whisk page: {url}")
+
+        try:
+            with sync_playwright() as p:
+                browser = p.chromium.launch(headless=not headed)
+                page = browser.new_page()
+                page.goto(url)
+                wa.install_readiness_tracking(page)
+                wa.install_result_harvester(page)
+                wa.install_throttle_detection(page)
+                with wa.phase_timer("login"):
+                    wa.login(page)
+
+                started = time.time()
+                for idx, (img_path, img_name) in enumerate(images):
+                    print(f"[{idx+1}/{count}] Processing: {img_name}")
+                    result = wa.process_image(page, img_path, img_name)
+                    wa.record_job_outcome(result)
+                    if result["status"] != "done":
+                        print(f"    ⚠️ {img_name}: {result['reason']}")
+                wa.flush_result_writer()
+                elapsed = time.time() - started
+                browser.close()
+        finally:
+            server.shutdown()
+
+    print("\n🏁 Benchmark finished")
+    print(f"    {count} images in {elapsed:.1f}s — {elapsed / count:.2f}s/image, "
+          f"{count / elapsed * 3600:.0f} images/hour "
+          f"(fake generation {gen_delay_ms}ms, upload {upload_delay_ms}ms)")
+    wa.print_metrics_summary()
+    wa.print_results_summary()
+    wa.print_readiness_report()
+    wa.print_strategy_report()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline Whisk bot benchmark against a local mock page")
+    parser.add_argument("--images", type=int, default=10, help="number of synthetic images (default 10)")
+    parser.add_argument("--delay", type=int, default=3000, help="fake generation time in ms (default 3000)")
+    parser.add_argument("--upload-delay", type=int, default=200, help="fake upload time in ms (default 200)")
+    parser.add_argument("--size", type=int, default=512, help="synthetic image size in px (default 512)")
+    parser.add_argument("--metrics-file", default=None,
+                        help="also write per-phase JSON lines here (default: summary only)")
+    parser.add_argument("--headed", action="store_true", help="show the browser window")
+    args = parser.parse_args(argv)
+
+    wa.METRICS_FILE = args.metrics_file
+    run_benchmark(args.images, args.delay, args.upload_delay, args.size, args.headed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+import http.server
+import urllib.error
+import urllib.request
+
+# ==========================================
+# DAEMON MODE
+# ==========================================
+# `serve` launches Chrome once, logs in, parks on the Whisk project page and then waits
+# for jobs over a small local HTTP API. `submit` hands it a folder or a list of images,
+# so repeated jobs start right away instead of paying for a browser launch and login.
+# whisk_automation (and Playwright) are only imported by `serve`, so the client stays light.
+
+DAEMON_HOST = "127.0.0.1"  # Only reachable from this machine
+DAEMON_PORT = 8765
+STATUS_POLL_SECONDS = 2    # How often `submit --wait` checks progress
+
+class DaemonHandler(http.server.BaseHTTPRequestHandler):
+    """JSON API: POST /jobs {"paths": [...]}, GET /status, POST /stop."""
+    state = None  # Set by serve(): submissions, progress, feeder_idle
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path != "/status":
+            self.send_error(404)
+            return
+        self.send_json(200, daemon_status(self.state))
+
+    def do_POST(self):
+        if self.path == "/jobs":
+            try:
+                paths = self.read_json()["paths"]
+            except (ValueError, KeyError, TypeError):
+                paths = None
+            if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+                self.send_json(400, {"error": 'expected {"paths": [...]} with a list of path strings'})
+                return
+            accepted = [os.path.realpath(path) for path in paths if os.path.exists(path)]
+            missing = [path for path in paths if not os.path.exists(path)]
+            if accepted:
+                self.state["submissions"].put(accepted)
+                print(f"📥 Received {len(accepted)} path(s) to process.")
+            self.send_json(202, {"accepted": len(accepted), "missing": missing})
+        elif self.path == "/stop":
+            self.state["submissions"].put(None)  # Ends the job stream; workers finish and exit
+            self.send_json(200, {"stopping": True})
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass  # The bot's own output is enough
+
+def daemon_status(state):
+    progress = state["progress"]
+    with progress["lock"]:
+        status = {"started": progress["done"], "finished": progress["finished"],
+                  "queued": progress["total"], "accepting": progress["feeding"]}
+    # Idle = nothing submitted, nothing being expanded, everything queued is finished
+    status["idle"] = (state["feeder_idle"].is_set() and state["submissions"].empty()
+                      and status["finished"] >= status["queued"])
+    return status
+
+def iter_submissions(submissions, feeder_idle, supported_extensions):
+    """
+    Yields (img_path, img_name) from submitted path lists — images as given, folders and
+    manifests expanded — until a None (stop) arrives.
+    """
+    import whisk_automation as wa
+
+    while True:
+        if submissions.empty():
+            feeder_idle.set()
+        paths = submissions.get()
+        feeder_idle.clear()
+        if paths is None:
+            return
+        for path in paths:
+            if os.path.isdir(path):
+                yield from wa.iter_images([path])
+            elif path.lower().endswith((".csv", ".jsonl", ".json")):
+                yield from wa.iter_manifest(path)
+            elif path.lower().endswith(supported_extensions):
+                yield path, os.path.basename(path)
+            else:
+                print(f"    ⚠️ Not an image, skipping: {path}")
+
+def serve(args):
+    """Runs the warm browser + job API until a `stop` request (or Ctrl+C)."""
+    import whisk_automation as wa
+
+    wa.apply_config(args.config)
+    wa.apply_browser_args(args)
+    print("🚀 Starting Whisk Automation daemon...")
+    journal = wa.load_journal()
+    submissions = queue.Queue()
+    feeder_idle = threading.Event()
+    filters = argparse.Namespace(shard=None, resume=False, retry_failed=False,
+                                 allow_duplicates=args.allow_duplicates)
+    images = wa.filter_images(iter_submissions(submissions, feeder_idle, wa.SUPPORTED_EXTENSIONS),
+                              filters, journal, streaming=True)
+
+    worker_count = max(1, args.workers or wa.WORKER_COUNT)
+    wa.stop_owned_browsers([wa.worker_profile_dir(worker_id) for worker_id in range(worker_count)])
+    wa.load_strategy_cache()
+
+    job_queue = queue.Queue()
+    progress = {"done": 0, "finished": 0, "total": 0, "feeding": True, "lock": threading.Lock()}
+    threading.Thread(target=wa.feed_jobs, args=(images, job_queue, progress, worker_count),
+                     name="whisk-feeder", daemon=True).start()
+
+    DaemonHandler.state = {"submissions": submissions, "progress": progress, "feeder_idle": feeder_idle}
+    server = http.server.ThreadingHTTPServer((args.host, args.port), DaemonHandler)
+    threading.Thread(target=server.serve_forever, name="whisk-daemon-api", daemon=True).start()
+    print(f"🛰️ Listening on http://{args.host}:{args.port} — "
+          f"send work with: python whisk_daemon.py submit <folder or images>")
+
+    try:
+        if worker_count == 1:
+            # Playwright runs on this thread; jobs arrive through the queue
+            wa.run_worker(0, job_queue, progress, journal)
+        else:
+            workers = []
+            for worker_id in range(worker_count):
+                wa.prepare_worker_profile(worker_id)
+                t = threading.Thread(target=wa.run_worker, args=(worker_id, job_queue, progress, journal),
+                                     name=f"whisk-worker-{worker_id + 1}", daemon=True)
+                t.start()
+                workers.append(t)
+            for t in workers:
+                t.join()
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping daemon...")
+    finally:
+        server.shutdown()
+        wa.flush_result_writer()
+        wa.print_run_reports()
+
+# ==========================================
+# CLIENT
+# ==========================================
+
+def call_daemon(args, method, path, payload=None):
+    """Sends one request to the daemon. Returns the decoded JSON reply."""
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    request = urllib.request.Request(f"http://{args.host}:{args.port}{path}", data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.loads(response.read() or b"{}")
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read() or b"{}")
+    except urllib.error.URLError as e:
+        sys.exit(f"❌ No daemon at {args.host}:{args.port} ({e.reason}). Start it with: python whisk_daemon.py serve")
+
+def daemon_running(host=DAEMON_HOST, port=DAEMON_PORT):
+    """The daemon's /status reply, or None if no daemon answers."""
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}/status", timeout=2) as response:
+            return json.loads(response.read() or b"{}")
+    except (OSError, ValueError):
+        return None
+
+def print_status(status):
+    print(f"📊 {status['finished']}/{status['queued']} finished, {status['started']} started"
+          f"{' — idle' if status['idle'] else ''}")
+
+def submit(args):
+    reply = call_daemon(args, "POST", "/jobs", {"paths": [os.path.abspath(path) for path in args.paths]})
+    if "error" in reply:
+        sys.exit(f"❌ {reply['error']}")
+    print(f"📤 Submitted {reply['accepted']} path(s).")
+    for path in reply.get("missing", []):
+        print(f"    ⚠️ Not found: {path}")
+    if not args.wait or not reply["accepted"]:
+        return
+
+    time.sleep(STATUS_POLL_SECONDS)  # Give the daemon a moment to expand the folders
+    while True:
+        status = call_daemon(args, "GET", "/status")
+        print_status(status)
+        if status["idle"]:
+            break
+        time.sleep(STATUS_POLL_SECONDS)
+    print("🎉 All submitted images processed!")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Whisk Automation Bot — daemon mode")
+    parser.add_argument("--host", default=DAEMON_HOST)
+    parser.add_argument("--port", type=int, default=DAEMON_PORT)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_cmd = commands.add_parser("serve", help="start the warm browser and wait for jobs")
+    serve_cmd.add_argument("--workers", type=int, default=None,
+                           help="Whisk pages processing jobs (default WORKER_COUNT)")
+    serve_cmd.add_argument("--allow-duplicates", action="store_true",
+                           help="process every file even if the same image content was already seen")
+    serve_cmd.add_argument("--headless", action="store_true", help="run Chrome without a window")
+    serve_cmd.add_argument("--lean", action="store_true", help="block analytics, fonts and media")
+    serve_cmd.add_argument("--config", default=None, metavar="FILE", help="JSON settings file")
+
+    submit_cmd = commands.add_parser("submit", help="send folders, images and/or manifests to the daemon")
+    submit_cmd.add_argument("paths", nargs="+")
+    submit_cmd.add_argument("--wait", action="store_true", help="wait until everything is processed")
+
+    commands.add_parser("status", help="show the daemon's progress")
+    commands.add_parser("stop", help="finish the queued jobs and shut the daemon down")
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        serve(args)
+    elif args.command == "submit":
+        submit(args)
+    elif args.command == "status":
+        print_status(call_daemon(args, "GET", "/status"))
+    elif args.command == "stop":
+        call_daemon(args, "POST", "/stop")
+        print("🛑 Daemon will stop after the queued jobs.")
+
+if __name__ == "__main__":
+    main()